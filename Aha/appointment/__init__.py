@@ -1,22 +1,165 @@
+from asyncio import Future, Task, create_task, get_running_loop, sleep
 from collections.abc import Callable
 from datetime import datetime, timedelta
+from logging import getLogger
 from re import Match
 
 from apscheduler.triggers.date import DateTrigger
+from sqlalchemy import delete, insert, select
 
 from core.api import API
 from core.config import cfg
+from core.database import db_sessionmaker
 from core.expr import PM
 from core.i18n import _
-from core.dispatcher import on_message, process_message
+from core.dispatcher import on_message, on_start, on_stop, process_message
 from models.api import Message
 from services.apscheduler import sched
 from utils.misc import decimal_to_str
 from utils.unit import chs2sec
 
+from .database import Inflight
+from .snapshot import dump_event, load_event
+from .wheel import TimerWheel
+
+BOT_RATE = cfg.register("bot_rate", 5, _("config_comment.bot_rate"))
+CONV_RATE = cfg.register("conv_rate", 1, _("config_comment.conv_rate"))
+JITTER = cfg.register("jitter", 3, _("config_comment.jitter"))
+
 if ENABLE_POINT := cfg.point_feat:
     from services.point import adjust_point, get_point
 
+_pending: dict[int, int] = {}
+_inflight: dict[int, int] = {}  # 轮中事件对象的 id -> Inflight 行 id
+# 检查点按定时轮刻度批量写入：_inserts 与 _written 对应下一批新增行，_deletes 为已分发待删除的行
+_inserts: list[tuple[int, bytes]] = []
+_deletes: list[int] = []
+_written: Future | None = None
+_writer: Task | None = None
+_logger = getLogger()
+
+
+async def _write_checkpoints():
+    """Insert the checkpoints of newly fired appointments and delete dispatched ones in a single transaction."""
+    global _written
+    inserts, deletes, written = _inserts[:], _deletes[:], _written
+    _inserts.clear()
+    _deletes.clear()
+    _written = None
+    if not inserts and not deletes:
+        return
+    try:
+        async with db_sessionmaker() as session:
+            rows = []
+            if inserts:
+                rows = (
+                    await session.execute(
+                        insert(Inflight).returning(Inflight.id, sort_by_parameter_order=True),
+                        [{"user_id": user_id, "snapshot": snapshot} for user_id, snapshot in inserts],
+                    )
+                ).scalars().all()
+            if deletes:
+                await session.execute(delete(Inflight).where(Inflight.id.in_(deletes)))
+            await session.commit()
+    except Exception as e:
+        # 删除失败时留到下一批，新增失败则交给等待中的 fire 抛出
+        _deletes.extend(deletes)
+        if written is not None:
+            written.set_exception(e)
+        else:
+            _logger.exception(e)
+        return
+    if written is not None:
+        written.set_result(rows)
+
+
+async def _tick():
+    global _writer
+    try:
+        await sleep(_wheel.tick)
+    finally:
+        _writer = None
+    await _write_checkpoints()
+
+
+def _schedule_write():
+    global _writer
+    if _writer is None:
+        _writer = create_task(_tick())
+
+
+async def _dispatch(event: Message):
+    row = _inflight.pop(id(event), None)
+    try:
+        await process_message(event, True)
+    finally:
+        if row is not None:
+            _deletes.append(row)
+            _schedule_write()
+
+
+_wheel = TimerWheel(_dispatch, BOT_RATE, CONV_RATE, JITTER)
+
+
+async def _pending_count(aha_id: int):
+    # 每个用户只在首次使用时扫描一次持久化计划，之后随新增、触发、取消增减
+    if (count := _pending.get(aha_id)) is None:
+        _pending[aha_id] = count = len(await sched.get_persist_schedules(metadata={"user_id": aha_id, "tag": "trigger"}))
+    return count
+
+
+async def fire(event: bytes | Message, aha_id: int):
+    global _written
+    if _pending.get(aha_id):
+        _pending[aha_id] -= 1
+    # 持久化计划触发后即被删除，在执行前另存一份（与同一刻度内触发的其他计划一起写入），重启时由 restore_inflight 放回定时轮
+    snapshot = event if isinstance(event, bytes) else dump_event(event)
+    if _written is None:
+        _written = get_running_loop().create_future()
+    written, index = _written, len(_inserts)
+    _inserts.append((aha_id, snapshot))
+    _schedule_write()
+    _inflight[id(event := load_event(snapshot))] = (await written)[index]
+    _wheel.add(event)
+
+
+@on_stop
+async def flush_checkpoints():
+    await _write_checkpoints()
+
+
+@on_start
+async def restore_inflight():
+    async with db_sessionmaker() as session:
+        rows = (await session.execute(select(Inflight.id, Inflight.snapshot))).all()
+    for row, snapshot in rows:
+        _inflight[id(event := load_event(snapshot))] = row
+        _wheel.add(event)
+    if rows:
+        _logger.info(_("appointment.restored") % len(rows))
+
+
+@on_start
+async def migrate_snapshots():
+    migrated = 0
+    schedules = await sched.get_persist_schedules(metadata={"tag": "trigger"})
+    # 新计划记下来源 id，上次迁移在新增与删除之间中断时不会重复新增
+    done = {s.metadata.get("migrated_from") for s in schedules}
+    for schedule in schedules:
+        if not schedule.args or not isinstance(event := schedule.args[0], Message):
+            continue
+        if schedule.id not in done:
+            await sched.add_persist_schedule(
+                fire,
+                schedule.trigger,
+                args=(dump_event(event), schedule.metadata["user_id"]),
+                metadata=schedule.metadata | {"migrated_from": schedule.id},
+            )
+        await sched.remove_schedule(schedule.id)
+        migrated += 1
+    if migrated:
+        _logger.info(_("appointment.migrated") % migrated)
+
 
 @on_message(_("appointment"), PM.prefix == True, register_help={_("appointment"): _("appointment.desc")})
 async def aps_trigger_main(event: Message, localizer):
@@ -29,7 +172,7 @@ async def aps_trigger(event: Message, match_: Match, localizer: Callable[[str],
         return await event.reply(localizer("appointment.identification_failed"))
 
     metadata = {"user_id": (aha_id := await event.user_aha_id()), "tag": "trigger"}
-    points = len(await sched.get_persist_schedules(metadata=metadata)) + 1
+    points = await _pending_count(aha_id) + 1
     if ENABLE_POINT and not await API.is_admin(event.group_id, event.user_id):
         if (user_point := await get_point(aha_id)) < points:
             return await event.reply(localizer("appointment.insufficient_funds") % (points, decimal_to_str(user_point)))
@@ -42,7 +185,8 @@ async def aps_trigger(event: Message, match_: Match, localizer: Callable[[str],
         del event.message[0]
     date = datetime.now() + timedelta(seconds=sec)
 
-    await sched.add_persist_schedule(process_message, DateTrigger(date), args=(event, True), metadata=metadata)
+    await sched.add_persist_schedule(fire, DateTrigger(date), args=(dump_event(event), aha_id), metadata=metadata)
+    _pending[aha_id] = _pending.get(aha_id, 0) + 1
     await event.reply(
         localizer("appointment.success")
         % {"point": points, "time": date.strftime("%Y年%m月%d日 %H:%M:%S"), "command": match_[3]}
@@ -51,7 +195,8 @@ async def aps_trigger(event: Message, match_: Match, localizer: Callable[[str],
 
 @on_message(_("appointment.cancel"))
 async def cannel_trigger(event: Message, localizer: Callable[[str], str]):
-    count = await sched.rm_persist_schedules_by_meta({"user_id": await event.user_aha_id(), "tag": "trigger"})
+    count = await sched.rm_persist_schedules_by_meta({"user_id": (aha_id := await event.user_aha_id()), "tag": "trigger"})
+    _pending[aha_id] = 0
     if ENABLE_POINT:
         await adjust_point(point := count * (count + 1) / 4)
         await event.reply(localizer("appointment.cancel.success") % (count, decimal_to_str(point)))
@@ -0,0 +1,48 @@
+"""Store size and load time of pending appointments: pickled events versus compact snapshots.
+
+Run from an Aha deployment, e.g. ``python -m <module package>.benchmark event.json -n 100000``,
+where ``event.json`` is a message event exported with ``event.model_dump_json()``.
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+from pickle import dumps, loads
+from time import perf_counter
+
+from models.api import Message
+
+from .snapshot import dump_event, load_event
+
+
+def measure(name: str, encode, decode, events: list[Message]):
+    start = perf_counter()
+    blobs = [encode(e) for e in events]
+    encoded = perf_counter() - start
+    start = perf_counter()
+    for b in blobs:
+        decode(b)
+    decoded = perf_counter() - start
+    size = sum(map(len, blobs))
+    print(f"{name:<10}{size / 2**20:>10.2f} MiB{size / len(blobs):>10.0f} B{encoded:>10.2f} s{decoded:>10.2f} s")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sample", type=Path, help="message event JSON used as the template")
+    parser.add_argument("-n", type=int, default=100000, help="number of pending appointments")
+    args = parser.parse_args()
+
+    template = Message.model_validate_json(args.sample.read_bytes())
+    events = []
+    for i in range(args.n):
+        event = template.model_copy(deep=True)
+        event.message_id = i
+        events.append(event)
+
+    print(f"{"format":<10}{"store":>14}{"per job":>12}{"encode":>12}{"load":>12}")
+    measure("pickle", lambda e: dumps((e, True)), loads, events)
+    measure("snapshot", dump_event, load_event, events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+from sqlalchemy import BigInteger, Column, Integer, LargeBinary
+
+from core.database import dbBase
+
+
+class Inflight(dbBase):
+    __tablename__ = "appointment_inflight"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger)
+    snapshot = Column(LargeBinary)
@@ -0,0 +1,57 @@
+from json import dumps, loads
+from types import UnionType
+from typing import Literal, Union, get_args, get_origin
+from zlib import compress, decompress
+
+from pydantic import BaseModel
+
+from models.api import Message
+
+VERSION = 1
+
+
+def _is_tag(annotation) -> bool:
+    if (origin := get_origin(annotation)) is Literal:
+        return True
+    return origin in (Union, UnionType) and any(map(_is_tag, get_args(annotation)))
+
+
+def _include(value):
+    """Nested ``include`` spec keeping required fields, literal tags (segment ``type`` and other discriminators) and
+    fields that differ from their default; everything else is restored by validation on load."""
+    if isinstance(value, BaseModel):
+        spec = {}
+        for name, field in type(value).model_fields.items():
+            item = getattr(value, name)
+            if (
+                field.is_required()
+                or _is_tag(field.annotation)
+                or item != field.get_default(call_default_factory=True)
+            ):
+                spec[name] = _include(item)
+        return spec or True
+    if isinstance(value, (list, tuple)):
+        return {i: _include(v) for i, v in enumerate(value)} or True
+    if isinstance(value, dict):
+        return {k: _include(v) for k, v in value.items()} or True
+    return True
+
+
+def dump_event[T: BaseModel](event: T) -> bytes:
+    """Encode the minimal field set of `event` as ``version byte + deflated JSON``."""
+    return bytes((VERSION,)) + compress(
+        dumps(
+            # 按段裁剪字段后联合类型的序列化器会告警，取值本身不受影响
+            event.model_dump(mode="json", by_alias=True, include=_include(event), warnings=False),
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode(),
+        9,
+    )
+
+
+def load_event[T: BaseModel](data: bytes, model: type[T] = Message) -> T:
+    match data[0]:
+        case 1:
+            return model.model_validate(loads(decompress(data[1:])))
+    raise ValueError(f"Unsupported event snapshot version: {data[0]}")
@@ -0,0 +1,88 @@
+from asyncio import Task, create_task, sleep
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from math import ceil
+from random import uniform
+from time import monotonic
+
+from models.api import Message
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.stamp = monotonic()
+
+    def ready(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+
+class TimerWheel:
+    """Hashed timer wheel that hands due events to `handler`, one slot per tick, rate limited per bot and per conversation.
+
+    Events that find no token are pushed back with fresh jitter, so a burst spreads out instead of being dropped.
+    """
+
+    __slots__ = ("handler", "tick", "slots", "cursor", "jitter", "_bots", "_convs", "_task", "_running")
+
+    def __init__(
+        self,
+        handler: Callable[[Message], Awaitable],
+        bot_rate: float,
+        conv_rate: float,
+        jitter: float,
+        tick: float = 0.5,
+        size: int = 512,
+    ):
+        self.handler = handler
+        self.tick = tick
+        self.slots: list[list[tuple[int, Message]]] = [[] for _ in range(size)]
+        self.cursor = 0
+        self.jitter = jitter
+        self._bots = defaultdict(lambda: TokenBucket(bot_rate, bot_rate))
+        self._convs = defaultdict(lambda: TokenBucket(conv_rate, conv_rate))
+        self._task: Task | None = None
+        self._running: set[Task] = set()
+
+    def add(self, event: Message, delay: float = 0):
+        ticks = max(ceil((delay + uniform(0, self.jitter)) / self.tick), 1)
+        self.slots[(self.cursor + ticks) % len(self.slots)].append(((ticks - 1) // len(self.slots), event))
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    def _release(self, event: Message, now: float):
+        if not (bot := self._bots[event.self_id]).ready(now):
+            return False
+        if not (conv := self._convs[(event.platform, event.group_id or event.user_id)]).ready(now):
+            return False
+        bot.take()
+        conv.take()
+        self._running.add(task := create_task(self.handler(event)))
+        task.add_done_callback(self._running.discard)
+        return True
+
+    async def _run(self):
+        while True:
+            await sleep(self.tick)
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            due, self.slots[self.cursor] = self.slots[self.cursor], []
+            now = monotonic()
+            for rounds, event in due:
+                if rounds:
+                    self.slots[self.cursor].append((rounds - 1, event))
+                elif not self._release(event, now):
+                    self.add(event)
+            if not self.cursor:
+                # 每转一圈清理已回满的令牌桶
+                for buckets in (self._bots, self._convs):
+                    for k in [k for k, b in buckets.items() if b.ready(now) and b.tokens >= b.capacity]:
+                        del buckets[k]
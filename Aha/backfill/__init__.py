@@ -1,6 +1,6 @@
-from asyncio import create_task, gather
-from bisect import bisect_left
-from collections.abc import Callable
+from asyncio import CancelledError, Event, Lock, create_task, gather, sleep, wait_for
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import suppress
 from datetime import datetime, timedelta
 from logging import getLogger
 from types import CoroutineType
@@ -13,17 +13,34 @@ from sqlalchemy import select
 from core.api import API, SS, select_bot
 from core.api_service import friend_conv_lock
 from core.database import db_sessionmaker
-from core.dispatcher import on_message, on_start, process_message
+from core.dispatcher import on_message, on_start, on_stop
 from core.i18n import _
 from models.api import Message
 from utils.sqlalchemy import upsert
 
-from .database import Status
+from .database import Activity, Processed, Status
+from .dedup import RotatingBloomFilter
+from .replay import Replayer
 
 COUNT = cfg.register("size", 1024, _("config_comment.count"))
+PAGE_SIZE = cfg.register("page_size", 64, _("config_comment.page_size"))
 LIMIT = cfg.register("seconds", 86400, _("config_comment.seconds"))
+FLUSH_INTERVAL = cfg.register("flush_interval", 5, _("config_comment.flush_interval"))
+FLUSH_THRESHOLD = cfg.register("flush_threshold", 256, _("config_comment.flush_threshold"))
+REPLAY_CONCURRENCY = cfg.register("replay_concurrency", 8, _("config_comment.replay_concurrency"))
+REPLAY_BOT_CONCURRENCY = cfg.register("replay_bot_concurrency", 2, _("config_comment.replay_bot_concurrency"))
+REPLAY_BATCH = cfg.register("replay_batch", 16, _("config_comment.replay_batch"))
+DEDUP_CAPACITY = cfg.register("dedup_capacity", 100000, _("config_comment.dedup_capacity"))
+DEDUP_SAVE_INTERVAL = cfg.register("dedup_save_interval", 2, _("config_comment.dedup_save_interval"))
 
 _callbacks = WeakSet()
+_dirty: dict[tuple[str, str, str], tuple[int, float | None]] = {}
+_flush_event = Event()
+_flusher_task = None
+_saver_task = None
+_processed = RotatingBloomFilter(DEDUP_CAPACITY)
+_processed_loaded = False
+_processed_lock = Lock()
 _logger = getLogger()
 
 
@@ -45,61 +62,238 @@ def reg_backfill(func=None):
         _logger.warning(_("not_available_callback"), stack_info=True)
 
 
+async def flush():
+    global _dirty
+    if not _dirty:
+        return
+    rows, _dirty = _dirty, {}
+    try:
+        async with db_sessionmaker() as session:
+            for (platform, group_id, user_id), (message, time) in rows.items():
+                await session.execute(upsert(Status, platform=platform, group_id=group_id, user_id=user_id, message=message))
+                if time is not None:
+                    await session.execute(upsert(Activity, platform=platform, group_id=group_id, user_id=user_id, time=time))
+            await session.commit()
+    except Exception:
+        # 写回未落盘的行，但不覆盖期间产生的更新游标
+        for k, v in rows.items():
+            _dirty.setdefault(k, v)
+        raise
+
+
+def _processed_key(event: Message):
+    return f"{event.platform}:{event.group_id or ""}:{"" if event.group_id else event.user_id}:{event.message_id}"
+
+
+def is_processed(event: Message):
+    return _processed_key(event) in _processed
+
+
+def mark_processed(event: Message):
+    _processed.add(_processed_key(event))
+
+
+async def load_processed():
+    global _processed_loaded
+    async with _processed_lock:
+        if _processed_loaded:
+            return
+        async with db_sessionmaker() as session:
+            for row in (await session.scalars(select(Processed))).all():
+                if row.generation in (0, 1) and not _processed.merge(row.generation, row.bits, row.count):
+                    _logger.info(_("dedup_resized"))
+        _processed_loaded = True
+
+
+async def save_processed():
+    if not _processed_loaded or not _processed.dirty:
+        return
+    generations, _processed.dirty = _processed.dirty, set()
+    try:
+        async with db_sessionmaker() as session:
+            for i in generations:
+                await session.execute(
+                    upsert(Processed, generation=i, count=_processed.counts[i], bits=bytes(_processed.generations[i]))
+                )
+            await session.commit()
+    except Exception:
+        _processed.dirty |= generations
+        raise
+
+
+async def _flusher():
+    try:
+        while True:
+            with suppress(TimeoutError):
+                await wait_for(_flush_event.wait(), FLUSH_INTERVAL if FLUSH_INTERVAL > 0 else None)
+            _flush_event.clear()
+            await _save_then_flush()
+    except CancelledError:
+        await _save_then_flush()
+        raise
+
+
+async def _save_then_flush():
+    """先保存过滤器再写游标，使过滤器的保存不少于游标的写入"""
+    try:
+        await save_processed()
+    except Exception:
+        _logger.exception(_("dedup_save_failed"))
+    try:
+        await flush()
+    except Exception:
+        _logger.exception(_("flush_failed"))
+
+
+async def _processed_saver():
+    """在两次游标写入之间保存去重过滤器，缩小已处理却未落盘的窗口"""
+    try:
+        while True:
+            await sleep(DEDUP_SAVE_INTERVAL)
+            try:
+                await save_processed()
+            except Exception:
+                _logger.exception(_("dedup_save_failed"))
+    except CancelledError:
+        try:
+            await save_processed()
+        except Exception:
+            _logger.exception(_("dedup_save_failed"))
+        raise
+
+
+@on_start
+async def start_flusher():
+    global _flusher_task, _saver_task
+    await load_processed()
+    _flusher_task = create_task(_flusher())
+    if DEDUP_SAVE_INTERVAL > 0:
+        _saver_task = create_task(_processed_saver())
+
+
+@on_stop
+async def stop_flusher():
+    """在数据库关闭前停止刷写任务，落盘剩余游标与去重过滤器"""
+    global _flusher_task, _saver_task
+    for task in (_flusher_task, _saver_task):
+        if task is not None:
+            task.cancel()
+            with suppress(CancelledError):
+                await task
+    _flusher_task = _saver_task = None
+    await save_processed()
+    await flush()
+
+
+async def save_cursor(platform: str, group_id: str, user_id: str, message: int, time: float = None):
+    """`time` 为会话最近一条消息的时间，回填推进游标时不提供"""
+    key = platform, group_id, user_id
+    if time is None and (old := _dirty.get(key)):
+        time = old[1]
+    _dirty[key] = message, time
+    if FLUSH_INTERVAL <= 0:
+        if DEDUP_SAVE_INTERVAL <= 0:
+            await save_processed()
+        await flush()
+    elif len(_dirty) >= FLUSH_THRESHOLD:
+        _flush_event.set()
+
+
 @on_message()
 async def record(event: Message):
-    async with db_sessionmaker() as session:
-        await session.execute(
-            upsert(
-                Status,
-                platform=event.platform,
-                user_id="" if event.group_id else event.user_id,
-                group_id=event.group_id or "",
-                message=event.message_id,
-            )
-        )
-        await session.commit()
+    # 到达即记为已处理：与游标在到达时推进的原有语义一致，崩溃时仍在处理中的消息不会被回填
+    mark_processed(event)
+    await save_cursor(
+        event.platform, event.group_id or "", "" if event.group_id else event.user_id, event.message_id, event.time.timestamp()
+    )
 
 
 if cfg.cache_conv:
     from core.api_service import friends
 
-    def del_unnecessary(events: list[Message], target_time, self_id):
-        if idx := bisect_left(events, target_time, key=lambda e: e.time):
-            del events[:idx]
-        else:
-            del events[0]
-        for i in range(len(events) - 1, -1, -1):
-            if events[i].user_id == self_id:
-                del events[i]
-
-    async def process_friend(row: Status, bot, target_time):
-        events = await API.get_private_msg_history(row.user_id, row.message, COUNT, bot=bot)
-        del_unnecessary(events, target_time, (await API.get_login_info(bot=bot)).user_id)
-        if events:
-            for e in events:
-                for c in _callbacks:
-                    create_task(process_message(e, once=c))
-            await record(events[-1])
-
-    async def process_row(row: Status, target_time):
+    async def iter_history(
+        fetch: Callable[[int, int], Awaitable[list[Message]]], cursor: int, target_time, self_id
+    ) -> AsyncIterator[tuple[list[Message], int]]:
+        """从游标起逐页向后拉取历史
+
+        Yields:
+            (过滤后的事件, 本页末尾游标)；过滤后为空的页与下一页合并，末尾为空时仍会产出一次以推进游标。
+        """
+        remaining, pending = COUNT, False
+        while remaining > 0:
+            raw = await fetch(cursor, min(PAGE_SIZE, remaining))
+            events = [
+                e
+                for e in raw
+                if e.message_id != cursor and e.time >= target_time and e.user_id != self_id and not is_processed(e)
+            ]
+            if raw and raw[-1].message_id != cursor:
+                cursor = raw[-1].message_id
+                pending = True
+            remaining -= len(raw)
+            if events:
+                yield events, cursor
+                pending = False
+            if len(raw) < PAGE_SIZE:
+                break
+        if pending:
+            yield [], cursor
+
+    async def replay_stream(bot, replayer: Replayer, pages: AsyncIterator, keys: tuple[str, str, str], latest: float):
+        async with replayer.fetching(bot):
+            first = await anext(pages, None)
+        if first:
+            await replayer.submit(bot, first, pages, lambda cursor: save_cursor(*keys, cursor), latest)
+
+    async def process_friend(row: Status, bot, target_time, replayer: Replayer, latest: float):
+        self_id = (await API.get_login_info(bot=bot)).user_id
+        pages = iter_history(
+            lambda cursor, count: API.get_private_msg_history(row.user_id, cursor, count, bot=bot), row.message, target_time, self_id
+        )
+        await replay_stream(bot, replayer, pages, (row.platform, "", row.user_id), latest)
+
+    async def logged(coro: Awaitable, row: Status):
+        """单个会话出错时只记录日志，不影响其他会话的回填"""
+        try:
+            await coro
+        except Exception:
+            _logger.exception(_("replay.row_failed") % (row.platform, row.group_id or row.user_id))
+
+    async def process_row(row: Status, target_time, replayer: Replayer, latest: float):
         if row.group_id:
             bot = await select_bot(SS.GROUP, platform=row.platform, conv_id=row.group_id)
-            events = await API.get_group_msg_history(row.group_id, row.message, COUNT, bot=bot)
-            del_unnecessary(events, target_time, (await API.get_login_info(bot=bot)).user_id)
-            if events:
-                for e in events:
-                    for c in _callbacks:
-                        create_task(process_message(e, once=c))
-                await record(events[-1])
+            self_id = (await API.get_login_info(bot=bot)).user_id
+            pages = iter_history(
+                lambda cursor, count: API.get_group_msg_history(row.group_id, cursor, count, bot=bot),
+                row.message,
+                target_time,
+                self_id,
+            )
+            await replay_stream(bot, replayer, pages, (row.platform, row.group_id, ""), latest)
         else:
             async with friend_conv_lock:
-                await gather(*[process_friend(row, bot, target_time) for bot in friends[row.platform][row.user_id]])
+                await gather(
+                    *[
+                        logged(process_friend(row, bot, target_time, replayer, latest), row)
+                        for bot in friends[row.platform][row.user_id]
+                    ]
+                )
 
     @on_start
     async def __():
         target_time = datetime.now().astimezone() - timedelta(seconds=LIMIT)
+        await load_processed()
         async with db_sessionmaker() as session:
-            await gather(*[process_row(row, target_time) for row in (await session.scalars(select(Status))).all()])
+            rows = (await session.scalars(select(Status))).all()
+            activity = {(a.platform, a.group_id, a.user_id): a.time for a in (await session.scalars(select(Activity))).all()}
+        # 按最近活跃时间排序后再拉取，名额有限时先入队的就是应先回放的会话
+        rows = sorted(
+            ((row, activity.get((row.platform, row.group_id, row.user_id))) for row in rows),
+            key=lambda item: item[1] or 0,
+            reverse=True,
+        )
+        replayer = Replayer(_callbacks, REPLAY_CONCURRENCY, REPLAY_BOT_CONCURRENCY, REPLAY_BATCH, mark_processed)
+        await replayer.run(gather(*[logged(process_row(row, target_time, replayer, latest), row) for row, latest in rows]))
 
 else:
     _logger.warning(_("unavailable"))
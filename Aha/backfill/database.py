@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, String
+from sqlalchemy import BigInteger, Column, Float, Integer, LargeBinary, String
 
 from core.database import dbBase
 
@@ -10,3 +10,20 @@ class Status(dbBase):
     group_id = Column(String(255), primary_key=True)
     user_id = Column(String(255), primary_key=True)
     message = Column(BigInteger, default=None)
+
+
+class Activity(dbBase):
+    __tablename__ = "backfill_activity"
+
+    platform = Column(String(16), primary_key=True)
+    group_id = Column(String(255), primary_key=True)
+    user_id = Column(String(255), primary_key=True)
+    time = Column(Float)
+
+
+class Processed(dbBase):
+    __tablename__ = "backfill_processed"
+
+    generation = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+    bits = Column(LargeBinary)
@@ -0,0 +1,46 @@
+from hashlib import blake2b
+from math import ceil, log
+
+
+class RotatingBloomFilter:
+    """Two-generation bloom filter; the older generation is dropped once the current one holds `capacity` keys."""
+
+    __slots__ = ("capacity", "size", "hashes", "generations", "counts", "dirty")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.size = ceil(-self.capacity * log(error_rate) / log(2) ** 2)
+        self.hashes = max(round(self.size / self.capacity * log(2)), 1)
+        self.generations = [bytearray((self.size + 7) >> 3), bytearray((self.size + 7) >> 3)]
+        self.counts = [0, 0]
+        self.dirty = {0, 1}
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key: str):
+        positions = self._positions(key)
+        return any(all(g[p >> 3] & (1 << (p & 7)) for p in positions) for g in self.generations)
+
+    def add(self, key: str):
+        if self.counts[0] >= self.capacity:
+            self.generations.reverse()
+            self.counts.reverse()
+            self.generations[0][:] = bytes(len(self.generations[0]))
+            self.counts[0] = 0
+            self.dirty.update((0, 1))
+        current = self.generations[0]
+        for p in self._positions(key):
+            current[p >> 3] |= 1 << (p & 7)
+        self.counts[0] += 1
+        self.dirty.add(0)
+
+    def merge(self, generation: int, bits: bytes, count: int):
+        """OR persisted bits into a generation; ignored when the filter was resized since they were saved."""
+        if len(bits) != len(current := self.generations[generation]):
+            return False
+        current[:] = (int.from_bytes(current) | int.from_bytes(bits)).to_bytes(len(current))
+        self.counts[generation] = min(self.counts[generation] + count, self.capacity)
+        return True
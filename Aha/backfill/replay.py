@@ -0,0 +1,146 @@
+from asyncio import Condition, Semaphore, create_task, gather
+from collections import defaultdict
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
+from itertools import batched, count
+from logging import getLogger
+from time import monotonic
+
+from core.dispatcher import process_message
+from core.i18n import _
+from models.api import Message
+
+_logger = getLogger()
+
+
+class Replayer:
+    """Replays fetched history, most recently active conversation first, with global and per-bot concurrency limits."""
+
+    __slots__ = (
+        "_callbacks",
+        "_batch",
+        "_concurrency",
+        "_fetch_slots",
+        "_bot_slots",
+        "_queue",
+        "_seq",
+        "_ready",
+        "_closed",
+        "_total",
+        "_done",
+        "_started",
+        "_last_report",
+        "_report_interval",
+        "_on_event",
+    )
+
+    def __init__(
+        self,
+        callbacks: Iterable[Callable],
+        concurrency: int,
+        bot_concurrency: int,
+        batch: int,
+        on_event: Callable[[Message], object] = None,
+        report_interval: float = 10,
+    ):
+        self._callbacks = tuple(callbacks)
+        self._batch = max(batch, 1)
+        self._concurrency = max(concurrency, 1)
+        self._fetch_slots = Semaphore(self._concurrency)
+        self._bot_slots = defaultdict(lambda: Semaphore(max(bot_concurrency, 1)))
+        self._queue = []
+        self._seq = count()
+        self._ready = Condition()
+        self._closed = False
+        self._total = self._done = 0
+        self._started = self._last_report = monotonic()
+        self._report_interval = report_interval
+        self._on_event = on_event
+
+    @asynccontextmanager
+    async def fetching(self, bot):
+        try:
+            async with self._fetch_slots, self._bot_slots[bot]:
+                yield
+        finally:
+            # 归还的 bot 名额可能让等待中的条目可以开始
+            async with self._ready:
+                self._ready.notify_all()
+
+    async def submit(
+        self,
+        bot,
+        first: tuple[list[Message], int],
+        pages: AsyncIterator[tuple[list[Message], int]],
+        on_page: Callable[[int], Awaitable],
+        latest: float = None,
+    ):
+        """`first` is the page already pulled from `pages` under `fetching`.
+
+        Conversations are ranked by their newest known message: `latest`, the time of the last message recorded live,
+        or the newest event of `first` if that is later.
+        """
+        newest = max((e.time.timestamp() for e in first[0]), default=0)
+        async with self._ready:
+            self._queue.append((-max(latest or 0, newest), next(self._seq), bot, first, pages, on_page))
+            self._total += len(first[0])
+            self._ready.notify()
+
+    async def run(self, producer: Awaitable):
+        workers = [create_task(self._worker()) for _ in range(self._concurrency)]
+        try:
+            await producer
+        finally:
+            async with self._ready:
+                self._closed = True
+                self._ready.notify_all()
+            await gather(*workers)
+        if self._total:
+            _logger.info(_("replay.done") % (self._done, monotonic() - self._started))
+
+    def _pick(self):
+        """The most recently active queued conversation whose bot has a free slot."""
+        return min((entry for entry in self._queue if not self._bot_slots[entry[2]].locked()), default=None)
+
+    async def _worker(self):
+        while True:
+            async with self._ready:
+                while (entry := self._pick()) is None:
+                    if self._closed and not self._queue:
+                        return
+                    await self._ready.wait()
+                self._queue.remove(entry)
+                bot, page, pages, on_page = entry[2:]
+                # 出队与占住 bot 名额在同一临界区内完成，不会取走条目后再排队等名额；名额空闲时 acquire 不挂起
+                await (slot := self._bot_slots[bot]).acquire()
+            try:
+                while page:
+                    events, cursor = page
+                    for e in events:
+                        failed = False
+                        for chunk in batched(self._callbacks, self._batch):
+                            results = await gather(*(process_message(e, once=c) for c in chunk), return_exceptions=True)
+                            failed |= any(isinstance(r, Exception) for r in results)
+                        # 只有所有回调都成功时才记为已处理
+                        if self._on_event and not failed:
+                            self._on_event(e)
+                        self._done += 1
+                        self._report()
+                    await on_page(cursor)
+                    try:
+                        if page := await anext(pages, None):
+                            self._total += len(page[0])
+                    except Exception:
+                        _logger.exception(_("replay.fetch_failed"))
+                        break
+            finally:
+                slot.release()
+                async with self._ready:
+                    self._ready.notify_all()
+
+    def _report(self):
+        if (now := monotonic()) - self._last_report < self._report_interval:
+            return
+        self._last_report = now
+        rate = self._done / (now - self._started)
+        _logger.info(_("replay.progress") % (self._done, self._total, (self._total - self._done) / rate if rate else 0))
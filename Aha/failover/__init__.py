@@ -1,22 +1,29 @@
 import os
-from asyncio import create_task, sleep, wait_for
+from asyncio import FIRST_COMPLETED, Task, create_subprocess_shell, create_task, gather, sleep, to_thread, wait, wait_for
+from asyncio.subprocess import DEVNULL
 from collections import defaultdict, deque
 from contextlib import suppress
 from enum import Enum, auto
+from datetime import datetime
+from json import dumps
 from logging import getLogger
+from time import monotonic
 
 from apscheduler.triggers.cron import CronTrigger
 
 from core.api import API
 from core.api_service import bots, call_api, start_bot
 from core.config import cfg
-from core.dispatcher import on_meta, on_start
-from core.expr import Field, FieldClause
+from core.dispatcher import on_message, on_meta, on_start
+from core.expr import PM, Field, FieldClause
 from core.i18n import _
-from models.api import MetaEvent
+from models.api import Message, MetaEvent
 from services.apscheduler import sched
 from utils.apscheduler import TimeTrigger
 
+from .probe import BotHealth, Health
+from .timeline import Incident, Timeline, percentile
+
 BACKUP_SERVERS = cfg.register(
     "backup_servers",
     {
@@ -50,12 +57,23 @@ taskkill /F /PID %TARGET_PID% 2>nul"""
     _("config_comment.servers"),
 )
 STARTUP_TIMEOUT = cfg.register("startup_timeout", 30, _("config_comment.timeout"))
+MODE = cfg.register("mode", "sequential", _("config_comment.mode"))
+PROBE_INTERVAL = cfg.register("probe_interval", 15, _("config_comment.probe_interval"))
+PROBE_WINDOW = cfg.register("probe_window", 8, _("config_comment.probe_window"))
+PROBE_LATENCY = cfg.register("probe_latency", 3, _("config_comment.probe_latency"))
+PROBE_FAIL_RATIO = cfg.register("probe_fail_ratio", 0.5, _("config_comment.probe_fail_ratio"))
+PROBE_FAIL_AFTER = cfg.register("probe_fail_after", 3, _("config_comment.probe_fail_after"))
+TIMELINE_FILE = cfg.register("timeline_file", "failover_timeline.jsonl", _("config_comment.timeline_file"))
 
 
 Ponline = FieldClause("online", Field(lambda event: event.status.online if event.status else None, priority=38))
 
 _server_status = defaultdict(lambda: Status.NEED_RESTART)
 _start_scheds = {}
+_known_bots: dict[str, MetaEvent] = {}
+_health = defaultdict(lambda: BotHealth(PROBE_WINDOW))
+_standby: dict[int, tuple[dict, object]] = {}  # 序号 -> (后备配置, 保持连接的临时 bot_id)
+_timeline = Timeline()
 _logger = getLogger()
 
 
@@ -68,45 +86,238 @@ for k, v in BACKUP_SERVERS.items():
     v.appendleft(cfg.bots[k])
 
 
+def _mark(event: MetaEvent, phase: str, **detail):
+    _timeline.mark(event.bot_id, event.adapter, phase, **detail)
+
+
+def _set_status(event: MetaEvent, status: Status):
+    _server_status[event.bot_id] = status
+    _mark(event, "status", status=status.name)
+
+
+async def _schedule_timeout(event: MetaEvent):
+    _start_scheds[event.bot_id] = await sched.add_schedule(offline, TimeTrigger(STARTUP_TIMEOUT), args=(event, True))
+    _mark(event, "timeout_scheduled", seconds=STARTUP_TIMEOUT)
+
+
+def _dump(incident: Incident):
+    with open(TIMELINE_FILE, "a", encoding="utf-8") as f:
+        f.write(dumps(incident.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+
 @on_start
 async def sched_startup():
     for bots in BACKUP_SERVERS.values():
         for bot in bots:
             if cron := next(iter(bot.items()))[1].get("_failover_cron"):
                 await sched.add_schedule(_heartbeat, CronTrigger.from_crontab(cron), args=(bot,))
+    if MODE == "standby":
+        for k, d in BACKUP_SERVERS.items():
+            if len(d) > 1:
+                create_task(_prewarm(k))
+    if PROBE_INTERVAL > 0:
+        create_task(_probe_loop())
 
 
 async def _heartbeat(config):
-    if all(x[0] is not config for x in BACKUP_SERVERS.values()):
-        task = create_task(wait_for(start_bot(config, block_event=True), 30))
-        await sleep(30)
+    if all(x[0] is not config and (MODE != "standby" or len(x) < 2 or x[1] is not config) for x in BACKUP_SERVERS.values()):
+        with suppress(Exception):
+            await call_api("stop_server", bot=await _probe(config))
+
+
+async def _probe_bot(bot_id):
+    start = monotonic()
+    try:
+        await wait_for(API.get_login_info(bot=bot_id), PROBE_LATENCY * 2)
+    except Exception:
+        return None
+    return monotonic() - start
+
+
+async def _probe_loop():
+    while True:
+        targets = [(k, v) for k, v in _known_bots.items() if _server_status[k] is Status.NEED_RESTART]
+        for (bot_id, event), latency in zip(targets, await gather(*(_probe_bot(k) for k, _v in targets))):
+            (health := _health[bot_id]).record(latency)
+            if not health.evaluate(PROBE_LATENCY, PROBE_FAIL_RATIO, PROBE_FAIL_AFTER):
+                continue
+            match health.state:
+                case Health.FAILED:
+                    error_rate = health.error_rate
+                    _logger.warning(_("probe.failed") % (f"{event.adapter}({bot_id})", error_rate * 100))
+                    health.reset()
+                    _mark(event, "probe_failed", error_rate=error_rate)
+                    create_task(offline(event))
+                case Health.DEGRADED:
+                    _logger.warning(
+                        _("probe.degraded") % (f"{event.adapter}({bot_id})", health.latency or 0, health.error_rate * 100)
+                    )
+                case Health.HEALTHY:
+                    _logger.info(_("probe.recovered") % f"{event.adapter}({bot_id})")
+        standby = tuple(_standby.items())
+        for (index, (config, bot_id)), latency in zip(standby, await gather(*(_probe_bot(v[1]) for _k, v in standby))):
+            if latency is None and _standby.get(index, (None, None))[1] == bot_id:
+                _logger.warning(_("standby_lost") % next(iter(config)))
+                await _release(index)
+                create_task(_prewarm(index))
+        # 有降级实例时加快探测
+        await sleep(PROBE_INTERVAL / 4 if any(h.state is Health.DEGRADED for h in _health.values()) else PROBE_INTERVAL)
+
+
+async def _probe(config):
+    """启动适配器实例的服务并建立不分发事件的连接，返回临时 bot_id"""
+    return (await wait_for(start_bot(config, block_event=True), STARTUP_TIMEOUT))[0]
+
+
+async def _prewarm(index: int):
+    """预热下一个后备服务并保持不分发事件的连接，探测循环借此确认其仍然可用"""
+    if (standby := _standby.get(index)) and standby[0] is BACKUP_SERVERS[index][1]:
+        return
+    await _release(index)
+    config = BACKUP_SERVERS[index][1]
+    try:
+        bot_id = await _probe(config)
+    except Exception:
+        _logger.warning(_("prewarm_failed") % next(iter(config)), exc_info=True)
+        return
+    # 预热期间已发生切换时，这个连接不再属于下一个后备
+    if index in _standby or len(BACKUP_SERVERS[index]) < 2 or BACKUP_SERVERS[index][1] is not config:
         with suppress(Exception):
-            await call_api("stop_server", bot=(await task)[0])
+            await call_api("close", bot=bot_id)
+    else:
+        _standby[index] = config, bot_id
+
+
+async def _release(index: int):
+    """断开保持的后备连接，服务进程保留"""
+    if standby := _standby.pop(index, None):
+        with suppress(Exception):
+            await call_api("close", bot=standby[1])
+
+
+async def _stop_command(config):
+    """执行配置中的停止命令，用于从未建立连接的服务进程"""
+    if not (command := next(iter(config.values())).get("stop_server_command")):
+        return
+    try:
+        process = await create_subprocess_shell(command, stdout=DEVNULL, stderr=DEVNULL)
+        await wait_for(process.wait(), STARTUP_TIMEOUT)
+    except Exception:
+        _logger.warning(_("stop_failed") % next(iter(config)), exc_info=True)
+
+
+async def _stop_loser(task: Task, config):
+    """停止落选的候选：已连接的经连接停止服务，超时或仍在启动的取消后执行停止命令"""
+    task.cancel()
+    await wait((task,))
+    if not task.cancelled() and task.exception() is None:
+        with suppress(Exception):
+            return await call_api("stop_server", bot=task.result())
+    await _stop_command(config)
+
+
+async def _race(candidates: list[dict]):
+    """同时启动所有候选服务，保留最先连接的，关闭其余
+
+    Returns:
+        胜出的配置，均未在超时内连接时为 None。
+    """
+    tasks = {create_task(_probe(c)): c for c in candidates}
+    pending, winner = set(tasks), None
+    while pending and winner is None:
+        done, pending = await wait(pending, return_when=FIRST_COMPLETED)
+        winner = next((task for task in done if not task.exception()), None)
+    for task, config in tasks.items():
+        if task is not winner:
+            create_task(_stop_loser(task, config))
+    if winner is None:
+        return None
+    with suppress(Exception):
+        await call_api("close", bot=winner.result())
+    return tasks[winner]
+
+
+@on_meta("heartbeat")
+async def heartbeat(event: MetaEvent):
+    _known_bots[event.bot_id] = event
 
 
 @on_meta("lifecycle", "connect")
 async def online(event: MetaEvent):
+    _known_bots[event.bot_id] = event
+    _health[event.bot_id].reset()
     if sch := _start_scheds.pop(event.bot_id, None):
         _logger.info(_("server_restore") % event.bot_id)
         await sched.remove_schedule(sch)
-        _server_status[event.bot_id] = Status.NEED_RESTART
+        _set_status(event, Status.NEED_RESTART)
+        if (incident := _timeline.end(event.bot_id)) and TIMELINE_FILE:
+            await to_thread(_dump, incident)
+        if MODE == "standby" and len(BACKUP_SERVERS[index := bots.index(event.bot_id)]) > 1:
+            create_task(_prewarm(index))
+
+
+async def _rotate(event: MetaEvent):
+    _logger.info(_("rotate.start") % f"{event.adapter}({event.bot_id})")
+    with suppress(Exception):
+        await call_api("close", bot=event.bot_id)
+    d = BACKUP_SERVERS[index := bots.index(event.bot_id)]
+    if MODE == "race" and len(d) > 1:
+        _mark(event, "race", candidates=len(d) - 1)
+        if (winner := await _race(list(d)[1:])) is None:
+            _logger.info(_("race.failed") % f"{event.adapter}({event.bot_id})")
+            await _schedule_timeout(event)
+            return
+        d.rotate(-next(i for i, c in enumerate(d) if c is winner))
+    else:
+        d.rotate(-1)
+    _mark(event, "rotate", to=next(iter(d[0])))
+    await _schedule_timeout(event)
+    # 保持的后备连接不分发事件，断开后以正式连接接入仍在运行的服务
+    await _release(index)
+    bots[event.bot_id] = (await start_bot(d[0], event.bot_id))[1]
 
 
 @on_meta(Ponline == False)
 async def offline(event: MetaEvent, is_timeout=False):
     match _server_status[event.bot_id]:
+        case Status.NEED_RESTART if MODE != "sequential":
+            _set_status(event, Status.STARTING)
+            await _rotate(event)
+
         case Status.NEED_RESTART:
             _logger.info(_("auto_restart") % f"{event.adapter}({event.bot_id})")
-            _server_status[event.bot_id] = Status.STARTING
-            await API.restart_server()
-            _start_scheds[event.bot_id] = await sched.add_schedule(offline, TimeTrigger(STARTUP_TIMEOUT), args=(event, True))
+            _set_status(event, Status.STARTING)
+            await API.restart_server(bot=event.bot_id)
+            _mark(event, "restart")
+            await _schedule_timeout(event)
 
         case Status.STARTING:
             if is_timeout:
-                _logger.info(_("rotate.start") % f"{event.adapter}({event.bot_id})")
-                await call_api("close", bot=event.bot_id)
-                (d := BACKUP_SERVERS[bots.index(event.bot_id)]).rotate(-1)
-                _start_scheds[event.bot_id] = await sched.add_schedule(
-                    offline, TimeTrigger(STARTUP_TIMEOUT), args=(event, True)
-                )
-                bots[event.bot_id] = (await start_bot(d[0], event.bot_id))[1]
+                _mark(event, "timeout")
+                await _rotate(event)
+
+
+@on_message(_("timeline"), PM.super == True)
+async def show_timeline(event: Message, localizer):
+    if not (incidents := list(_timeline.history)[-5:] + list(_timeline.open.values())):
+        return await event.reply(localizer("timeline.empty"))
+    lines = []
+    for incident in incidents:
+        lines.append(
+            localizer("timeline.incident")
+            % {
+                "bot": f"{incident.adapter}({incident.bot_id})",
+                "time": datetime.fromtimestamp(incident.started).strftime("%m-%d %H:%M:%S"),
+                "duration": incident.duration,
+                "state": localizer("timeline.ended" if incident.ended else "timeline.ongoing"),
+            }
+        )
+        lines.extend(
+            f"  +{t - incident.started:.1f}s {p}{"".join(f" {k}={v}" for k, v in d.items())}" for t, p, d in incident.phases
+        )
+    if durations := _timeline.durations():
+        lines.append(
+            localizer("timeline.summary")
+            % (len(durations), percentile(durations, 0.5), percentile(durations, 0.9), max(durations))
+        )
+    await event.reply("\n".join(lines))
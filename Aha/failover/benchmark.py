@@ -0,0 +1,174 @@
+"""Failover MTTR benchmark against fake OneBot WebSocket services.
+
+Run from an Aha deployment, e.g. ``python -m <module package>.benchmark --crashes 200``.
+Every adapter instance is a ``fakews.FakeOneBot`` on a local port; ``start_bot``, ``call_api`` and ``API`` of this package
+are replaced by a client that really connects to it over WebSocket, so cold starts, refused connections, standby
+connections and stopped losers all go through sockets. Recovery time is read from the incident timeline the same way
+``show_timeline`` reports it.
+"""
+
+import logging
+import random
+from argparse import ArgumentParser
+from asyncio import create_task, gather, get_running_loop, run, sleep
+from collections import defaultdict, deque
+from importlib import import_module
+from itertools import count
+from types import SimpleNamespace
+
+failover = import_module(__package__)
+timeline = import_module(f"{__package__}.timeline")
+fakews = import_module(f"{__package__}.fakews")
+
+
+class Harness:
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self.rng = rng
+        self.ids = count(1000)
+        self.probes = {}
+        self.handles = set()
+        self.tasks = set()
+        self.configs = [{f"Sim{i}": {}} for i in range(args.backups + 1)]
+
+    def scaled(self, seconds):
+        return seconds * self.args.scale
+
+    def server(self, config) -> "fakews.FakeOneBot":
+        return next(iter(config.values()))["server"]
+
+    async def reset(self):
+        for connection, _server in self.probes.values():
+            await connection.close()
+        self.probes.clear()
+        for i, config in enumerate(self.configs):
+            if server := next(iter(config.values())).get("server"):
+                await server.stop()
+            next(iter(config.values()))["server"] = server = fakews.FakeOneBot(
+                self.scaled(self.rng.uniform(0.5, 1.5) * self.args.startup),
+                self.scaled(self.args.connect),
+                i > 0 and self.rng.random() < self.args.fail_rate,
+            )
+            next(iter(config.values()))["uri"] = server.uri
+
+    def meta(self):
+        return SimpleNamespace(bot_id=1, adapter="Sim", status=None)
+
+    async def start_bot(self, config, bot_id=None, block_event=False):
+        # 与真实适配器一致：先拉起服务，再连接直至收到 lifecycle connect，服务起不来时不会返回
+        await (server := self.server(config)).start()
+        connection = await fakews.connect(next(iter(config.values()))["uri"])
+        self.probes[tmp := next(self.ids)] = connection, server
+        if bot_id is not None and not block_event:
+            self.later(0, failover.online, self.meta())
+        return tmp, connection
+
+    async def call_api(self, action, bot=None):
+        if not (probe := self.probes.pop(bot, None)):
+            raise ConnectionError(bot)
+        connection, server = probe
+        await connection.close()
+        if action == "stop_server":
+            await server.stop()
+
+    async def get_login_info(self, bot=None):
+        if not (probe := self.probes.get(bot)):
+            raise ConnectionError(bot)
+        return await probe[0].call("get_login_info")
+
+    async def stop_command(self, config):
+        await self.server(config).stop()
+
+    async def restart_server(self, bot=None):
+        if self.rng.random() < self.args.restart_rate:
+            self.later(self.scaled(self.args.startup), failover.online, self.meta())
+
+    def spawn(self, func, *args):
+        self.tasks.add(task := create_task(func(*args)))
+        task.add_done_callback(self.tasks.discard)
+
+    def later(self, delay, func, *args):
+        handle = get_running_loop().call_later(delay, self.spawn, func, *args)
+        self.handles.add(handle)
+        return handle
+
+    async def add_schedule(self, func, trigger, args=()):
+        return self.later(trigger, func, *args)
+
+    async def remove_schedule(self, handle):
+        handle.cancel()
+
+    def install(self, mode: str):
+        failover.start_bot = self.start_bot
+        failover.call_api = self.call_api
+        failover.API = SimpleNamespace(restart_server=self.restart_server, get_login_info=self.get_login_info)
+        failover._stop_command = self.stop_command
+        failover.sched = SimpleNamespace(add_schedule=self.add_schedule, remove_schedule=self.remove_schedule)
+        failover.TimeTrigger = lambda seconds: seconds
+        failover.bots = _Bots()
+        failover.BACKUP_SERVERS = {0: deque(self.configs)}
+        failover.STARTUP_TIMEOUT = self.scaled(self.args.timeout)
+        failover.MODE = mode
+        failover.TIMELINE_FILE = ""
+        failover._timeline = timeline.Timeline(self.args.crashes)
+
+    async def crash(self):
+        await self.reset()
+        failover._server_status = defaultdict(lambda: failover.Status.NEED_RESTART)
+        failover._start_scheds = {}
+        failover._standby.clear()
+        if failover.MODE == "standby":
+            await failover._prewarm(0)
+        recovered = len(history := failover._timeline.history)
+        # 与真实适配器一致，服务起不来时 start_bot 不会返回，因此不等待 offline 本身
+        self.spawn(failover.offline, self.meta())
+        deadline = get_running_loop().time() + self.scaled(self.args.timeout) * (self.args.backups + 2) * 4
+        while len(history) == recovered and get_running_loop().time() < deadline:
+            await sleep(self.scaled(0.1))
+        for handle in self.handles:
+            handle.cancel()
+        self.handles.clear()
+        for task in tuple(self.tasks):
+            task.cancel()
+        await gather(*self.tasks, return_exceptions=True)
+        failover._timeline.open.clear()
+        return history[-1].duration / self.args.scale if len(history) > recovered else None
+
+
+class _Bots:
+    def index(self, bot_id):
+        return 0
+
+    def __setitem__(self, key, value):
+        pass
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["sequential", "standby", "race"])
+    parser.add_argument("--crashes", type=int, default=100)
+    parser.add_argument("--backups", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30, help="startup timeout, seconds")
+    parser.add_argument("--startup", type=float, default=15, help="mean cold start time of a service, seconds")
+    parser.add_argument("--connect", type=float, default=0.5, help="extra handshake latency of a running service, seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.2, help="probability that a backup never comes up")
+    parser.add_argument("--restart-rate", type=float, default=0.5, help="probability that restarting the primary works")
+    parser.add_argument("--scale", type=float, default=0.01, help="wall clock seconds per simulated second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{"mode":<12}{"n":>6}{"lost":>6}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}")
+    for mode in args.modes:
+        (harness := Harness(args, random.Random(args.seed))).install(mode)
+        results = [await harness.crash() for _ in range(args.crashes)]
+        durations = [r for r in results if r is not None]
+        print(
+            f"{mode:<12}{len(durations):>6}{len(results) - len(durations):>6}"
+            + "".join(f"{timeline.percentile(durations, q):>8.1f}s" for q in (0.5, 0.9, 0.99))
+            + f"{max(durations, default=0):>8.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    run(main())
@@ -0,0 +1,234 @@
+"""Fake OneBot v11 WebSocket services for failover tests, standard library only.
+
+``FakeOneBot`` listens only after its cold start delay, greets every connection with a lifecycle connect meta event and
+answers ``get_login_info``; ``connect`` is the matching client used by ``benchmark``.
+Run ``python -m <module package>.fakews --port 3001 --startup 15`` and point a backup server's ``uri`` (and its
+``start_server_command``) at it to drive a real Aha instance through a switchover.
+"""
+
+import json
+import os
+import socket
+import struct
+import time
+from argparse import ArgumentParser
+from asyncio import Event, IncompleteReadError, Task, create_task, open_connection, run, shield, sleep, start_server
+from base64 import b64encode
+from contextlib import suppress
+from hashlib import sha1
+from itertools import count
+from urllib.parse import urlsplit
+
+_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_TEXT, _CLOSE, _PONG = 0x1, 0x8, 0xA
+
+
+def _accept(key: str) -> str:
+    return b64encode(sha1(key.encode() + _GUID).digest()).decode()
+
+
+def _mask(payload: bytes, mask: bytes) -> bytes:
+    return bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+def _frame(opcode: int, payload: bytes, masked: bool) -> bytes:
+    head, bit = bytes((0x80 | opcode,)), 0x80 if masked else 0
+    if (n := len(payload)) < 126:
+        head += bytes((bit | n,))
+    elif n < 1 << 16:
+        head += bytes((bit | 126,)) + struct.pack("!H", n)
+    else:
+        head += bytes((bit | 127,)) + struct.pack("!Q", n)
+    if masked:
+        head += (mask := os.urandom(4))
+        payload = _mask(payload, mask)
+    return head + payload
+
+
+async def _read_headers(reader) -> tuple[str, dict[str, str]]:
+    first, *lines = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    return first, {k.strip().lower(): v.strip() for k, _s, v in (line.partition(":") for line in lines if line)}
+
+
+class Connection:
+    """One end of a WebSocket connection carrying JSON text frames; clients mask their frames, servers do not."""
+
+    def __init__(self, reader, writer, masked: bool):
+        self.reader = reader
+        self.writer = writer
+        self.masked = masked
+        self.echo = count()
+
+    async def _write(self, opcode: int, payload: bytes):
+        self.writer.write(_frame(opcode, payload, self.masked))
+        await self.writer.drain()
+
+    async def send(self, data: dict):
+        await self._write(_TEXT, json.dumps(data).encode())
+
+    async def recv(self) -> dict:
+        while True:
+            head = await self.reader.readexactly(2)
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if head[1] & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = _mask(payload, mask)
+            match opcode:
+                case 0x1:
+                    return json.loads(payload)
+                case 0x8:
+                    raise ConnectionResetError("websocket closed")
+                case 0x9:
+                    await self._write(_PONG, payload)
+
+    async def call(self, action: str, **params):
+        """Send an API request and wait for the response with the same echo, skipping events in between."""
+        await self.send({"action": action, "params": params, "echo": (echo := str(next(self.echo)))})
+        while (response := await self.recv()).get("echo") != echo:
+            pass
+        if response.get("status") != "ok":
+            raise RuntimeError(f"{action} failed: {response.get('retcode')}")
+        return response.get("data")
+
+    async def close(self):
+        with suppress(Exception):
+            await self._write(_CLOSE, b"")
+        self.writer.close()
+        with suppress(Exception):
+            await self.writer.wait_closed()
+
+
+class FakeOneBot:
+    """A OneBot implementation stand-in; connections are refused until `startup` seconds after `start`, forever when `broken`."""
+
+    def __init__(self, startup: float = 0, latency: float = 0, broken: bool = False, self_id: int = 10000, host="127.0.0.1", port=0):
+        self.startup = startup
+        self.latency = latency
+        self.broken = broken
+        self.self_id = self_id
+        self.host = host
+        if not port:
+            # 先占一个空闲端口，未监听时连接会被拒绝，与冷启动中的真实服务一致
+            with socket.socket() as s:
+                s.bind((host, 0))
+                port = s.getsockname()[1]
+        self.port = port
+        self.server = None
+        self.connections: set[Connection] = set()
+        self._booting: Task | None = None
+
+    @property
+    def uri(self):
+        return f"ws://{self.host}:{self.port}"
+
+    @property
+    def running(self):
+        return self.server is not None
+
+    async def start(self):
+        """Start the service if it is not running; returns once it accepts connections."""
+        if self.server is None:
+            if self._booting is None:
+                self._booting = create_task(self._boot())
+            await shield(self._booting)
+
+    async def _boot(self):
+        await sleep(self.startup)
+        if self.broken:
+            await Event().wait()
+        self.server = await start_server(self._serve, self.host, self.port, reuse_address=True)
+
+    async def stop(self):
+        if self._booting is not None:
+            self._booting.cancel()
+            self._booting = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        for connection in tuple(self.connections):
+            await connection.close()
+
+    async def _serve(self, reader, writer):
+        try:
+            _first, headers = await _read_headers(reader)
+            writer.write(
+                (
+                    "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {_accept(headers.get('sec-websocket-key', ''))}\r\n\r\n"
+                ).encode()
+            )
+            self.connections.add(connection := Connection(reader, writer, masked=False))
+            await sleep(self.latency)
+            await connection.send(self._event("lifecycle", sub_type="connect"))
+            while True:
+                await connection.send(self.handle(await connection.recv()))
+        except (IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections = {c for c in self.connections if c.writer is not writer}
+            writer.close()
+
+    def _event(self, meta_event_type: str, **detail):
+        return {
+            "time": int(time.time()),
+            "self_id": self.self_id,
+            "post_type": "meta_event",
+            "meta_event_type": meta_event_type,
+        } | detail
+
+    def handle(self, request: dict) -> dict:
+        match request.get("action"):
+            case "get_login_info":
+                response = {"status": "ok", "retcode": 0, "data": {"user_id": self.self_id, "nickname": "FakeOneBot"}}
+            case _:
+                response = {"status": "failed", "retcode": 1404, "data": None}
+        return response | {"echo": request.get("echo")}
+
+
+async def connect(uri: str) -> Connection:
+    """Connect to a OneBot WebSocket service, retrying while it refuses, and wait for its lifecycle connect event.
+
+    Bound it with ``wait_for``: a service that never comes up is retried forever, like a real adapter.
+    """
+    url = urlsplit(uri)
+    while True:
+        try:
+            reader, writer = await open_connection(url.hostname, url.port or 80)
+            break
+        except OSError:
+            await sleep(0.05)
+    key = b64encode(os.urandom(16)).decode()
+    writer.write(
+        (
+            f"GET {url.path or '/'} HTTP/1.1\r\nHost: {url.netloc}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode()
+    )
+    first, headers = await _read_headers(reader)
+    if " 101 " not in first or headers.get("sec-websocket-accept") != _accept(key):
+        writer.close()
+        raise ConnectionError(f"websocket handshake with {uri} failed: {first}")
+    connection = Connection(reader, writer, masked=True)
+    while (await connection.recv()).get("meta_event_type") != "lifecycle":
+        pass
+    return connection
+
+
+async def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--startup", type=float, default=0, help="cold start time, seconds")
+    parser.add_argument("--self-id", type=int, default=10000)
+    args = parser.parse_args()
+    await FakeOneBot(args.startup, self_id=args.self_id, host=args.host, port=args.port).start()
+    await Event().wait()
+
+
+if __name__ == "__main__":
+    run(main())
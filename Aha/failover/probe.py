@@ -0,0 +1,55 @@
+from collections import deque
+from enum import Enum, auto
+from statistics import median
+
+
+class Health(Enum):
+    HEALTHY = auto()
+    DEGRADED = auto()
+    FAILED = auto()
+
+
+class BotHealth:
+    """Sliding window of probe results for one bot; `None` latency marks a failed probe."""
+
+    __slots__ = ("samples", "state")
+
+    def __init__(self, window: int):
+        self.samples: deque[float | None] = deque(maxlen=max(window, 1))
+        self.state = Health.HEALTHY
+
+    def record(self, latency: float | None):
+        self.samples.append(latency)
+
+    @property
+    def error_rate(self):
+        return sum(x is None for x in self.samples) / len(self.samples) if self.samples else 0
+
+    @property
+    def latency(self):
+        return median(ok) if (ok := [x for x in self.samples if x is not None]) else None
+
+    @property
+    def consecutive_errors(self):
+        count = 0
+        for x in reversed(self.samples):
+            if x is not None:
+                break
+            count += 1
+        return count
+
+    def evaluate(self, max_latency: float, fail_ratio: float, fail_after: int):
+        if self.consecutive_errors >= fail_after or (
+            len(self.samples) >= fail_after and self.error_rate >= fail_ratio
+        ):
+            state = Health.FAILED
+        elif self.consecutive_errors or (latency := self.latency) is not None and latency > max_latency:
+            state = Health.DEGRADED
+        else:
+            state = Health.HEALTHY
+        changed, self.state = state is not self.state, state
+        return changed
+
+    def reset(self):
+        self.samples.clear()
+        self.state = Health.HEALTHY
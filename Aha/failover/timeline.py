@@ -0,0 +1,66 @@
+from collections import deque
+from time import time
+
+
+class Incident:
+    __slots__ = ("bot_id", "adapter", "started", "ended", "phases")
+
+    def __init__(self, bot_id, adapter: str):
+        self.bot_id = bot_id
+        self.adapter = adapter
+        self.started = time()
+        self.ended: float | None = None
+        self.phases: list[tuple[float, str, dict]] = []
+
+    def mark(self, phase: str, **detail):
+        self.phases.append((time(), phase, detail))
+
+    @property
+    def duration(self):
+        return (self.ended or time()) - self.started
+
+    def to_dict(self):
+        return {
+            "bot_id": self.bot_id,
+            "adapter": self.adapter,
+            "started": self.started,
+            "ended": self.ended,
+            "duration": self.duration,
+            "phases": [{"at": t, "offset": t - self.started, "phase": p, **d} for t, p, d in self.phases],
+        }
+
+
+class Timeline:
+    """Per-bot failover incidents; an incident opens on the first mark after recovery and closes on `end`."""
+
+    __slots__ = ("history", "open")
+
+    def __init__(self, maxlen: int = 50):
+        self.history: deque[Incident] = deque(maxlen=maxlen)
+        self.open: dict[object, Incident] = {}
+
+    def mark(self, bot_id, adapter: str, phase: str, **detail):
+        if (incident := self.open.get(bot_id)) is None:
+            self.open[bot_id] = incident = Incident(bot_id, adapter)
+        incident.mark(phase, **detail)
+        return incident
+
+    def end(self, bot_id, phase: str = "connect"):
+        if (incident := self.open.pop(bot_id, None)) is None:
+            return None
+        incident.mark(phase)
+        incident.ended = incident.phases[-1][0]
+        self.history.append(incident)
+        return incident
+
+    def durations(self):
+        return [i.duration for i in self.history]
+
+
+def percentile(values: list[float], q: float):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo = int(k)
+    return values[lo] + (values[min(lo + 1, len(values) - 1)] - values[lo]) * (k - lo)
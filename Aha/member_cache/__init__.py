@@ -0,0 +1,71 @@
+from asyncio import Lock
+from collections import defaultdict
+from time import monotonic
+
+from core.api import API
+from core.config import cfg
+from core.dispatcher import on_message, on_notice
+from core.expr import PM
+from core.i18n import _
+from models.api import Message, Notice
+
+from .cache import MISS, TTLCache
+
+TTL = cfg.register("ttl", 600, _("config_comment.ttl"))
+SIZE = cfg.register("size", 4096, _("config_comment.size"))
+RESYNC = cfg.register("member_resync", 3600, _("config_comment.member_resync"))
+
+_cards = TTLCache(SIZE, TTL)
+_members: dict[tuple[str, str], tuple[float, set[str]]] = {}
+_member_locks = defaultdict(Lock)
+
+
+async def get_card(platform: str, group_id: str, user_id: str, full=False):
+    """Cached `API.get_card_by_search`; `full` returns (card, nickname)."""
+    if (result := _cards.get(key := (platform, group_id, user_id, full))) is MISS:
+        _cards.set(key, result := await API.get_card_by_search(user_id, group_id, full))
+    return result
+
+
+def invalidate(platform: str, group_id: str, user_id: str):
+    _cards.pop((platform, group_id, user_id, False))
+    _cards.pop((platform, group_id, user_id, True))
+
+
+async def get_members(platform: str, group_id: str):
+    """Member ids of a group, loaded on first use and fully reloaded every `member_resync` seconds."""
+    if (item := _members.get(key := (platform, group_id))) is None or item[0] < monotonic():
+        async with _member_locks[key]:
+            if (item := _members.get(key)) is None or item[0] < monotonic():
+                members = {i.user_id for i in await API.get_group_members(group_id)}
+                _members[key] = item = (monotonic() + RESYNC, members)
+    return item[1]
+
+
+async def is_member(platform: str, group_id: str, user_id: str):
+    return user_id in await get_members(platform, group_id)
+
+
+@on_notice("group_card")
+async def refresh(event: Notice):
+    invalidate(event.platform, event.group_id, event.user_id)
+
+
+@on_notice("group_increase")
+async def member_join(event: Notice):
+    invalidate(event.platform, event.group_id, event.user_id)
+    if item := _members.get((event.platform, event.group_id)):
+        item[1].add(event.user_id)
+
+
+@on_notice("group_decrease")
+async def member_leave(event: Notice):
+    invalidate(event.platform, event.group_id, event.user_id)
+    if item := _members.get((event.platform, event.group_id)):
+        item[1].discard(event.user_id)
+
+
+@on_message(_("stats"), PM.super == True)
+async def stats(event: Message, localizer):
+    ratio = _cards.hits / total * 100 if (total := _cards.hits + _cards.misses) else 0
+    await event.reply(localizer("stats.reply") % (len(_cards), _cards.hits, _cards.misses, ratio))
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from time import monotonic
+
+MISS = object()
+
+
+class TTLCache:
+    """LRU cache whose entries also expire `ttl` seconds after being set."""
+
+    __slots__ = ("size", "ttl", "hits", "misses", "_data")
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+
+    def get(self, key: Hashable):
+        if (item := self._data.get(key)) is None or item[0] < monotonic():
+            self._data.pop(key, None)
+            self.misses += 1
+            return MISS
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value):
+        self._data[key] = (monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
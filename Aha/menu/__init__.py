@@ -1,27 +1,172 @@
 from collections.abc import Callable
+from enum import Enum
+from functools import partial
+from re import Match, Pattern
+from types import BuiltinFunctionType, FunctionType, MethodType
 
 from core.config import cfg
-from core.expr import PM, And, Or, evaluate
+from core.expr import PM, And, FieldClause, Or, evaluate
 from core.i18n import _
-from core.dispatcher import help_items, on_message
+from core.dispatcher import help_items, on_message, on_start
 from models.api import Message
 
+from .search import HelpIndex
+
 try:
     from ..backfill_aha import reg_backfill
 except Exception:
     reg_backfill = lambda x: x
 
+CACHE_SIZE = cfg.register("cache_size", 1024, _("config_comment.cache_size"))
+SEARCH_LIMIT = cfg.register("search_limit", 5, _("config_comment.search_limit"))
 
-@reg_backfill
-@on_message(Or(PM.message == _("help"), And(_("help_with_prefix"), PM.prefix == True)), threadable=False)
-async def help(event: Message, localizer: Callable[[str], str]):
-    available_commands = {}
+_cache: dict[tuple, str] = {}
+_cache_version = None
+_index = HelpIndex()
+_static: list[tuple] = []
+_keyed: list[tuple] = []
+_verdicts: dict[tuple, bool] = {}
+# 只依赖这些字段的条件按字段取值缓存求值结果；platform、group_id 直接读事件属性，super、prefix 需经表达式求值
+_KEY_FIELDS = {
+    id(clause): name
+    for name in ("platform", "group_id", "super", "prefix")
+    if isinstance(clause := getattr(PM, name, None), FieldClause)
+}
+_PROBES = {"super": PM.super == True, "prefix": PM.prefix == True}
+
+
+def _sync():
+    """Drop cached menus, reclassify help items and rebuild the search index once `help_items` has changed."""
+    global _cache_version, _static, _keyed
+    if (version := tuple(map(id, help_items))) != _cache_version:
+        _cache.clear()
+        _verdicts.clear()
+        _static, _keyed = _classify()
+        _index.rebuild(help_items)
+        _cache_version = version
+
+
+@on_start
+async def build_index():
+    _sync()
+
+
+def _reads(expr, seen: set[int]) -> set[str] | None:
+    """Names of the key fields `expr` reads, or None if it reads any other field or hides logic in a callable."""
+    if isinstance(expr, FieldClause):
+        return {name} if (name := _KEY_FIELDS.get(id(expr))) else None
+    if expr is None or isinstance(expr, (bool, int, float, Enum)):
+        return set()
+    if isinstance(expr, (str, bytes, Pattern, partial, FunctionType, MethodType, BuiltinFunctionType)):
+        # 字符串按消息内容匹配，函数内部读取什么无从得知
+        return None
+    if id(expr) in seen:
+        return set()
+    seen.add(id(expr))
+    if isinstance(expr, (tuple, list, set, frozenset)):
+        children = list(expr)
+    elif isinstance(expr, dict):
+        children = list(expr.values())
+    else:
+        children = list(getattr(expr, "__dict__", {}).values())
+        children += [
+            getattr(expr, slot)
+            for cls in type(expr).__mro__
+            for slot in (cls.__dict__.get("__slots__") or ())
+            if isinstance(slot, str) and slot not in ("__dict__", "__weakref__") and hasattr(expr, slot)
+        ]
+        if not children:
+            return None
+    # 与字段并列的字符串是比较的取值，而不是消息匹配
+    operand = any(isinstance(child, FieldClause) for child in children)
+    fields = set()
+    for child in children:
+        if operand and isinstance(child, str):
+            continue
+        if (names := _reads(child, seen)) is None:
+            return None
+        fields |= names
+    return fields
+
+
+def _classify():
+    """Split help items into always visible ones and ones whose visibility has to be evaluated.
+
+    Conditional items carry the sorted key fields they read, or None when they have to be evaluated on every request.
+    """
+    static, keyed = [], []
     for command, expr, desc in help_items:
-        if await evaluate(event, expr):
-            available_commands[command] = desc
+        if expr is None or expr is True:
+            static.append((command, desc))
+        elif expr is not False:
+            fields = _reads(expr, set())
+            keyed.append((command, expr, desc, None if fields is None else tuple(sorted(fields))))
+    return static, keyed
+
+
+def _remember[T](cache: dict[tuple, T], key: tuple, value: T, size: int) -> T:
+    if len(cache) >= size:
+        del cache[next(iter(cache))]
+    cache[key] = value
+    return value
+
+
+async def _visible(event: Message) -> tuple[int, ...]:
+    """Indices of the visible conditional items; ones reading only key fields are evaluated once per field values."""
+    values = {}
+    visible = []
+    for i, (_c, expr, _d, fields) in enumerate(_keyed):
+        if fields is None:
+            shown = await evaluate(event, expr)
+        else:
+            for name in fields:
+                if name not in values:
+                    probe = _PROBES.get(name)
+                    values[name] = bool(await evaluate(event, probe)) if probe else getattr(event, name, None)
+            if (shown := _verdicts.get(key := (i, *map(values.__getitem__, fields)))) is None:
+                shown = _remember(_verdicts, key, bool(await evaluate(event, expr)), CACHE_SIZE * max(len(_keyed), 1))
+        if shown:
+            visible.append(i)
+    return tuple(visible)
+
+
+def _render(visible: tuple[int, ...], localizer: Callable[[str], str]):
+    available_commands = dict(_static)
+    for i in visible:
+        command, _expr, desc, _fields = _keyed[i]
+        available_commands[command] = desc
     commands = [
         localizer("menu.line_with_desc") % (cmd, desc) if isinstance(desc, str) else localizer("menu.line") % cmd
         for cmd, desc in available_commands.items()
     ]
     commands.sort(key=lambda x: (-len(x), x))
-    await event.reply(localizer("menu.join").join((localizer("menu.head"), *commands, localizer("menu.tail") % cfg.get_msg_prefix())))
+    return localizer("menu.join").join((localizer("menu.head"), *commands, localizer("menu.tail") % cfg.get_msg_prefix()))
+
+
+@reg_backfill
+@on_message(Or(PM.message == _("help"), And(_("help_with_prefix"), PM.prefix == True)), threadable=False)
+async def help(event: Message, localizer: Callable[[str], str]):
+    _sync()
+    # 渲染后的菜单按可见条件项组合缓存，menu.head 用于区分语言
+    if (menu := _cache.get(key := (localizer("menu.head"), await _visible(event)))) is None:
+        menu = _remember(_cache, key, _render(key[1], localizer), CACHE_SIZE)
+    await event.reply(menu)
+
+
+@reg_backfill
+@on_message(And(_("help_search"), PM.prefix == True), threadable=False)
+async def search(event: Message, match_: Match, localizer: Callable[[str], str]):
+    _sync()
+    commands = []
+    for cmd, expr, desc in _index.search(keyword := match_[1].strip()):
+        if expr is False or expr is not None and expr is not True and not await evaluate(event, expr):
+            continue
+        commands.append(
+            localizer("menu.line_with_desc") % (cmd, desc) if isinstance(desc, str) else localizer("menu.line") % cmd
+        )
+        if len(commands) >= SEARCH_LIMIT:
+            break
+    if commands:
+        await event.reply(localizer("menu.join").join((localizer("menu.search.head") % keyword, *commands)))
+    else:
+        await event.reply(localizer("menu.search.none") % keyword)
@@ -0,0 +1,43 @@
+from collections import defaultdict
+
+
+def _grams(text: str, n: int, pad=True):
+    text = f" {text.casefold()} " if pad else text.casefold()
+    return {g for i in range(len(text) - n + 1) if not (g := text[i : i + n]).isspace()}
+
+
+class HelpIndex:
+    """Inverted n-gram index (n = 1..3) over help commands and descriptions; names weigh twice as much as descriptions."""
+
+    __slots__ = ("_names", "_descs", "_items")
+
+    def __init__(self):
+        self._names: dict[str, set[int]] = defaultdict(set)
+        self._descs: dict[str, set[int]] = defaultdict(set)
+        self._items: list[tuple] = []
+
+    def rebuild(self, items):
+        self._names.clear()
+        self._descs.clear()
+        self._items = list(items)
+        for i, (command, _expr, desc) in enumerate(self._items):
+            for n in (1, 2, 3):
+                for g in _grams(str(command), n):
+                    self._names[g].add(i)
+                if isinstance(desc, str):
+                    for g in _grams(desc, n):
+                        self._descs[g].add(i)
+
+    def search(self, query: str):
+        """Yield (command, expr, desc) ordered by relevance; at least half of the query has to match."""
+        if not (grams := _grams(query := query.strip(), min(len(query), 3), False)):
+            return
+        scores = defaultdict(int)
+        for g in grams:
+            for i in self._names.get(g, ()):
+                scores[i] += 2
+            for i in self._descs.get(g, ()):
+                scores[i] += 1
+        matched = [i for i, score in scores.items() if score >= len(grams)]
+        for i in sorted(matched, key=lambda i: (-scores[i], len(str(self._items[i][0])))):
+            yield self._items[i]
@@ -0,0 +1,59 @@
+from asyncio import Task, create_task
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from math import inf
+from time import monotonic
+
+from core.api import API
+from core.config import cfg
+from core.i18n import _
+from models.api import Message, Notice
+
+WINDOW = cfg.register("window", 10, _("config_comment.window"))
+GROUP_RATE = cfg.register("group_rate", 6, _("config_comment.group_rate"))
+BACKOFF_MAX = cfg.register("backoff_max", 3600, _("config_comment.backoff_max"))
+IGNORE = cfg.register("ignore", [], _("config_comment.ignore"))
+
+_last: dict[tuple, tuple[float, float]] = {}  # (platform, group, user) -> (上次时间, 当前合并窗口)
+_group_pokes: defaultdict[tuple, deque[float]] = defaultdict(deque)
+_tasks: set[Task] = set()
+
+
+def _done(task: Task):
+    _tasks.discard(task)
+    if not task.cancelled():
+        task.exception()
+
+
+def poke_later(event: Message | Notice, factory: Callable[[], Awaitable] = None):
+    """Poke in the background unless the same user was poked within the merge window or the group is over its rate.
+
+    Pokes from the bot itself or from `ignore` are never answered. Answering a poke notice doubles that sender's window
+    up to `backoff_max` while it keeps poking, so two bots that poke back stop looping instead of settling at
+    `group_rate`. The task is created in the caller's context, so context-bound calls such as `API.poke()` still target
+    the event.
+
+    Returns:
+        Whether a poke was sent.
+    """
+    if str(event.user_id) == str(event.self_id) or str(event.user_id) in map(str, IGNORE):
+        return False
+    now = monotonic()
+    last, window = _last.get(key := (event.platform, event.group_id, event.user_id), (-inf, WINDOW))
+    if now - last < window:
+        return False
+    pokes = _group_pokes[(event.platform, event.group_id or event.user_id)]
+    while pokes and now - pokes[0] >= 60:
+        pokes.popleft()
+    if len(pokes) >= GROUP_RATE:
+        return False
+
+    if len(_last) > 4096:
+        for k in [k for k, (t, w) in _last.items() if now - t >= w * 2]:
+            del _last[k]
+    # 窗口结束后不久又被戳才翻倍，安静两个窗口后恢复
+    _last[key] = now, min(window * 2, BACKOFF_MAX) if isinstance(event, Notice) and now - last < window * 2 else WINDOW
+    pokes.append(now)
+    _tasks.add(task := create_task((factory or API.poke)()))
+    task.add_done_callback(_done)
+    return True
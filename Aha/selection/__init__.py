@@ -0,0 +1,112 @@
+from collections.abc import Awaitable, Callable, Sequence
+from re import Match
+from time import time
+
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import delete, select
+
+from core.config import cfg
+from core.database import db_sessionmaker
+from core.dispatcher import on_message, on_start
+from core.expr import Field, FieldClause
+from core.i18n import _
+from models.api import Message
+from services.apscheduler import sched
+from utils.sqlalchemy import upsert
+
+from .database import Selection
+
+TTL = cfg.register("ttl", 300, _("config_comment.ttl"))
+PERSIST = cfg.register("persist", False, _("config_comment.persist"))
+
+
+class Pending:
+    __slots__ = ("platform", "user_id", "owner", "choices", "once", "expires")
+
+    def __init__(self, platform: str, user_id: str, owner: str, choices: tuple, once: bool, expires: float):
+        self.platform = platform
+        self.user_id = user_id
+        self.owner = owner
+        self.choices = choices
+        self.once = once
+        self.expires = expires
+
+
+_owners: dict[str, Callable[[Message, object], Awaitable]] = {}
+_pending: dict[int, Pending] = {}
+_waiting: dict[tuple[str, str], int] = {}
+
+Pselecting = FieldClause("selecting", Field(lambda event: (event.platform, event.user_id) in _waiting, priority=20))
+
+
+def selection_owner(owner: str):
+    """Register the callback `(event, choice)` that receives the choices offered under `owner`."""
+
+    def decorator(func: Callable[[Message, object], Awaitable]):
+        _owners[owner] = func
+        return func
+
+    return decorator
+
+
+def _drop(uid: int):
+    if (pending := _pending.pop(uid, None)) is not None and _waiting.get(key := (pending.platform, pending.user_id)) == uid:
+        del _waiting[key]
+
+
+async def offer(event: Message, owner: str, choices: Sequence, once=False, ttl: float = None):
+    """Let the sender pick one of `choices` by replying with its 1-based number within `ttl` seconds.
+
+    A later offer to the same user replaces the earlier one; `once` withdraws the offer after the first pick.
+    With `persist` enabled the choices have to be storable in an `Iterable` column.
+    """
+    uid = await event.user_aha_id()
+    _drop(uid)
+    pending = Pending(event.platform, event.user_id, owner, tuple(choices), once, time() + (ttl or TTL))
+    _pending[uid] = pending
+    _waiting[(event.platform, event.user_id)] = uid
+    if PERSIST:
+        async with db_sessionmaker() as session:
+            await session.execute(upsert(Selection, uid=uid, **{k: getattr(pending, k) for k in Pending.__slots__}))
+            await session.commit()
+
+
+async def withdraw(uid: int):
+    _drop(uid)
+    if PERSIST:
+        async with db_sessionmaker() as session:
+            await session.execute(delete(Selection).where(Selection.uid == uid))
+            await session.commit()
+
+
+@on_message(r"(\d+)", Pselecting == True, threadable=False)
+async def choose(event: Message, match_: Match):
+    if (uid := _waiting.get((event.platform, event.user_id))) is None or (pending := _pending.get(uid)) is None:
+        return
+    if pending.expires <= time():
+        return await withdraw(uid)
+    if not 0 <= (index := int(match_[1]) - 1) < len(pending.choices) or (callback := _owners.get(pending.owner)) is None:
+        return
+    if pending.once:
+        await withdraw(uid)
+    await callback(event, pending.choices[index])
+
+
+async def sweep():
+    now = time()
+    for uid in [uid for uid, p in _pending.items() if p.expires <= now]:
+        _drop(uid)
+    if PERSIST:
+        async with db_sessionmaker() as session:
+            await session.execute(delete(Selection).where(Selection.expires <= now))
+            await session.commit()
+
+
+@on_start
+async def load_selections():
+    if PERSIST:
+        async with db_sessionmaker() as session:
+            for row in await session.scalars(select(Selection).where(Selection.expires > time())):
+                _pending[row.uid] = Pending(row.platform, row.user_id, row.owner, tuple(row.choices), row.once, row.expires)
+                _waiting[(row.platform, row.user_id)] = row.uid
+    await sched.add_schedule(sweep, IntervalTrigger(seconds=60))
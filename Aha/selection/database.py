@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Boolean, Column, Float, String
+
+from core.database import dbBase
+from models.sqlalchemy import Iterable
+
+
+class Selection(dbBase):
+    __tablename__ = "pending_selection"
+
+    uid = Column(BigInteger, primary_key=True)
+    platform = Column(String(16))
+    user_id = Column(String(255))
+    owner = Column(String(64))
+    choices = Column(Iterable)
+    once = Column(Boolean, default=False)
+    expires = Column(Float, index=True)
@@ -0,0 +1,68 @@
+from asyncio import Task, create_task, shield
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from functools import wraps
+
+from core.dispatcher import on_message
+from core.expr import PM
+from core.i18n import _
+from models.api import Message
+
+_inflight: dict[tuple, Task] = {}
+_requests = Counter()
+_upstream = Counter()
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return tuple(map(_freeze, sorted(obj) if isinstance(obj, (set, frozenset)) else obj))
+    return obj
+
+
+def _done(key: tuple):
+    def callback(task: Task):
+        if _inflight.get(key) is task:
+            del _inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    return callback
+
+
+def single_flight(service: str, key: Callable[..., object] = None):
+    """Share one in-flight call, and its result or exception, among concurrent calls with the same key.
+
+    Args:
+        service: Name used in the key and in the counters.
+        key: Builds the key from the call arguments; defaults to all arguments. Dicts and lists are normalized.
+    """
+
+    def decorator[**P, R](func: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            k = (service, _freeze(key(*args, **kwargs) if key else (args, kwargs)))
+            _requests[service] += 1
+            if (task := _inflight.get(k)) is None:
+                _upstream[service] += 1
+                _inflight[k] = task = create_task(func(*args, **kwargs))
+                task.add_done_callback(_done(k))
+            # 单个调用方被取消时不影响其他等待者
+            return await shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+@on_message(_("stats"), PM.super == True)
+async def stats(event: Message, localizer):
+    if not _requests:
+        return await event.reply(localizer("stats.empty"))
+    await event.reply(
+        "\n".join(
+            localizer("stats.line") % (service, total, _upstream[service], total - _upstream[service])
+            for service, total in sorted(_requests.items())
+        )
+    )
@@ -8,12 +8,19 @@ from core.dispatcher import on_message, process_message
 from models.api import Message
 from models.msg import At
 
+try:
+    from ..member_cache_aha import get_card
+except Exception:
+
+    async def get_card(platform, group_id, user_id, full=False):
+        return await API.get_card_by_search(user_id, group_id, full)
+
 
 @on_message(_("trigger") % at_or_str(), PM.super == True, threadable=False)
 async def trigger(event: Message, match_: Match):
     event.user_id = user_id = match_[2]
 
-    user_info = await API.get_card_by_search(event.user_id, event.group_id, True)
+    user_info = await get_card(event.platform, event.group_id, event.user_id, True)
     event.sender.card, event.sender.nickname = user_info
     if processed := (seg := event.message[0]).text.removeprefix(match_[1].partition("[Aha")[0]).strip():
         seg.text = processed
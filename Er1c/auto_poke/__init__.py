@@ -12,13 +12,20 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from asyncio import create_task
+
 from models.api import Notice
 
 from core.dispatcher import on_notice
 from core.api import API
 
+try:
+    from ..poke_aha import poke_later
+except Exception:
+    poke_later = lambda event, factory=None: create_task((factory or API.poke)())
+
 
 @on_notice("notify", "poke")
 async def poke(event: Notice):
-    if event.target_id == event.self_id:
-        await API.poke()
+    if event.target_id == event.self_id and event.user_id != event.self_id:
+        poke_later(event)
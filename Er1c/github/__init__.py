@@ -14,6 +14,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 from asyncio import create_task
 from re import Match
+from sys import exception
 from traceback import format_exc
 
 from core.api import API
@@ -24,14 +25,30 @@ from models.api import Message
 from utils.aha import post_msg_to_supers
 
 from .client import GithubClient, Repository
+from .ratelimit import RateLimited
 
 try:
     from ..backfill_aha import reg_backfill
 except Exception:
     reg_backfill = lambda x: x
 
+try:
+    from ..poke_aha import poke_later
+except Exception:
+    poke_later = lambda event, factory=None: create_task((factory or API.poke)())
+
+try:
+    from ..selection_aha import offer, selection_owner
+except Exception:
+    # 没有 selection 模块时只列出相似结果，不接受序号选择
+    offer, selection_owner = None, lambda owner: lambda func: func
+
 SHORTCUT = cfg.register("shortcut", {"aha": "Eric-Joker/Aha"})
 TOKEN = cfg.register("token", "")
+TOKENS = cfg.register("tokens", [])
+QUEUE_WAIT = cfg.register("queue_wait", 5)
+CACHE_SIZE = cfg.register("cache_size", 512)
+PREFETCH = cfg.register("prefetch", 0)
 
 
 @reg_backfill
@@ -47,7 +64,7 @@ async def send_repo_response(event: Message, result: Repository):
             f"🔗 链接: {result.html_url}\n"
             f"📝 简介: {result.description or '暂无描述'}\n"
             f"🌐 语言: {result.language or '未指定'}\n"
-            f"⭐ {result.stars} | 🍴 {result.forks} | 👀 {result.watchers}\n"
+            f"⭐ {result.stars} | 🍴 {result.forks}{f" | 👀 {result.watchers}" if result.watchers is not None else ""}\n"
             f"📜 证书: {(result.license.name if result.license else None) or '无'}\n"
             f"⏰ 创建于: {result.created_at} | 更新于: {result.updated_at}"
         ),
@@ -55,6 +72,8 @@ async def send_repo_response(event: Message, result: Repository):
 
 
 async def handle_error(event: Message):
+    if isinstance(e := exception(), RateLimited):
+        return await event.reply(f"Github 请求额度已用尽，请 {e.wait} 秒后再试。")
     create_task(post_msg_to_supers(f"请求 Github 时报错：\n{format_exc()}"))
     await event.reply("出错了。")
 
@@ -62,17 +81,18 @@ async def handle_error(event: Message):
 @reg_backfill
 @on_message(r"(?:gh|github)\s*([\s\S]+)", threadable=False)
 async def fetch_repo(event: Message, match_: Match):
-    await API.poke()
+    poke_later(event)
 
     is_repo = "/" in (term := SHORTCUT.get((term := match_[1].strip()).lower()) or term)
     try:
         if is_repo and (result := await GithubClient.get_repo(term)):
             await send_repo_response(event, result)
         else:
-            similar = await GithubClient.cache_search(uid := await event.user_aha_id(), term)
-            on_message(r"(\d+)", PM.uid == uid, exp=300, callback=reget)
+            if (similar := tuple(await GithubClient.search_repos(term))) and offer:
+                await offer(event, "github", [r.model_dump_json() for r in similar])
+                GithubClient.prefetch(similar)
             await event.reply(
-                f"{"找不到该仓库。" if is_repo else ""}{f"相似的有：\n{"\n".join(f"{i+1}. {v}" for i, v in enumerate(similar))}\n五分钟内发送序号即可获取" if similar else "未搜索到相似仓库。"}"
+                f"{"找不到该仓库。" if is_repo else ""}{f"相似的有：\n{"\n".join(f"{i+1}. {v}" for i, v in enumerate(r.full_name for r in similar))}{"\n五分钟内发送序号即可获取" if offer else ""}" if similar else "未搜索到相似仓库。"}"
             )
     except Exception:
         await handle_error(event)
@@ -81,7 +101,7 @@ async def fetch_repo(event: Message, match_: Match):
 @reg_backfill
 @on_message(r"gu\s*([\s\S]+)")
 async def fetch_gh_user(event: Message, match_: Match):
-    await API.poke()
+    poke_later(event)
     try:
         await event.reply(
             (
@@ -101,10 +121,12 @@ async def fetch_gh_user(event: Message, match_: Match):
         await handle_error(event)
 
 
-async def reget(event: Message, match_: Match):
-    create_task(API.poke())
+@selection_owner("github")
+async def reget(event: Message, choice: str):
+    poke_later(event)
     try:
-        if result := await GithubClient.get_cached_repo(await event.user_aha_id(), int(match_[1]) - 1):
-            await send_repo_response(event, result)
+        result = Repository.model_validate_json(choice)
+        # 预取完成时使用包含关注数的完整信息
+        await send_repo_response(event, GithubClient.peek_repo(result.full_name) or result)
     except Exception:
         await handle_error(event)
@@ -0,0 +1,62 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from collections import OrderedDict
+
+
+class Entry:
+    __slots__ = ("etag", "last_modified", "body", "parsed")
+
+    def __init__(self, etag: str | None, last_modified: str | None, body: bytes):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.parsed = {}
+
+    @property
+    def validators(self):
+        """条件请求所需的请求头"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ConditionalCache:
+    """按接口与参数缓存响应体及其 ETag/Last-Modified，容量满时淘汰最久未用的条目"""
+
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple, Entry] = OrderedDict()
+
+    @staticmethod
+    def key(endpoint: str, params: dict | None):
+        return endpoint, tuple(sorted((params or {}).items()))
+
+    def get(self, key: tuple):
+        if (entry := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple, entry: Entry, size: int):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple):
+        self._entries.pop(key, None)
@@ -12,18 +12,23 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from asyncio import Task, create_task
+
 from httpx import HTTPStatusError, RequestError
-from pydantic import BaseModel, Field
-from sqlalchemy import select
+from pydantic import BaseModel, ConfigDict, Field
 from ssrjson import loads
 from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 from core.config import cfg
-from core.database import db_sessionmaker
 from utils.network import get_httpx_client
-from utils.sqlalchemy import upsert
 
-from .database import GithubSearch
+from .cache import ConditionalCache, Entry
+from .ratelimit import TokenPool
+
+try:
+    from ..single_flight_aha import single_flight
+except Exception:
+    single_flight = lambda service, key=None: lambda func: func
 
 
 class LicenseInfo(BaseModel):
@@ -34,12 +39,16 @@ class LicenseInfo(BaseModel):
 
 
 class Repository(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    full_name: str | None = None
     name: str | None
     description: str | None
     language: str | None
     forks: int | None = Field(validation_alias="forks_count")
     stars: int | None = Field(validation_alias="stargazers_count")
-    watchers: int | None = Field(validation_alias="subscribers_count")
+    # 搜索接口不返回 subscribers_count
+    watchers: int | None = Field(None, validation_alias="subscribers_count")
     license: LicenseInfo | None = None
     created_at: str | None
     updated_at: str | None
@@ -59,7 +68,12 @@ class User(BaseModel):
 
 
 class GithubClient:
+    _cache = ConditionalCache()
+    _pool = TokenPool()
+    _prefetching: set[Task] = set()
+
     @classmethod
+    @single_flight("github", lambda cls, endpoint, params=None: (endpoint, params))
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(min=5, max=15),
@@ -68,54 +82,72 @@ class GithubClient:
         reraise=True,
     )
     async def _fetch_api(cls, endpoint: str, params: dict = None):
-        (
-            response := await get_httpx_client().get(
-                f"https://api.github.com/{endpoint}",
-                params=params,
-                headers={"Authorization": f"Bearer {cfg.token}"} if cfg.token else None,
-            )
-        ).raise_for_status()
+        entry = cls._cache.get(key := ConditionalCache.key(endpoint, params))
+        tokens = [t for t in (cfg.token, *cfg.tokens) if t] or [""]
+        resource = TokenPool.resource(endpoint)
+        while True:
+            token = await cls._pool.acquire(tokens, resource, cfg.queue_wait)
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            if entry is not None:
+                headers |= entry.validators
+            response = await get_httpx_client().get(f"https://api.github.com/{endpoint}", params=params, headers=headers)
+            # 该令牌被限流时立即换下一个令牌，而不是交给 tenacity 退避
+            if not (cls._pool.update(token, resource, response.headers) and response.status_code in (403, 429)):
+                break
+        # 304 不计入速率限制，直接复用缓存的响应体
+        if response.status_code == 304 and entry is not None:
+            return entry.body
+        response.raise_for_status()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            cls._cache.put(key, Entry(etag, last_modified, response.content), cfg.cache_size)
+        else:
+            cls._cache.discard(key)
         return response.content
 
     @classmethod
-    async def get_repo(cls, repo: str):
+    async def _fetch_model[T: BaseModel](cls, model: type[T], endpoint: str) -> T | None:
+        """请求并校验为模型；响应体来自缓存时复用已校验的模型"""
         try:
-            return Repository.model_validate_json(await cls._fetch_api(f"repos/{repo}"))
+            body = await cls._fetch_api(endpoint)
         except HTTPStatusError as e:
             if e.response.status_code == 404:
                 return None
             raise
+        if (entry := cls._cache.get(ConditionalCache.key(endpoint, None))) is None or entry.body is not body:
+            return model.model_validate_json(body)
+        if (parsed := entry.parsed.get(model)) is None:
+            entry.parsed[model] = parsed = model.model_validate_json(body)
+        return parsed
+
+    @classmethod
+    async def get_repo(cls, repo: str):
+        return await cls._fetch_model(Repository, f"repos/{repo}")
 
     @classmethod
     async def get_user(cls, username: str):
-        try:
-            return User.model_validate_json(await cls._fetch_api(f"users/{username}"))
-        except HTTPStatusError as e:
-            if e.response.status_code == 404:
-                return None
-            raise
+        return await cls._fetch_model(User, f"users/{username}")
 
     @classmethod
     async def search_repos(cls, query: str, limit: int = 5):
         data = loads(await cls._fetch_api("search/repositories", params={"q": query, "per_page": limit, "sort": "stars"}))
-        return (item["full_name"] for item in data.get("items", []))
+        return (Repository.model_validate(item) for item in data.get("items", []))
 
     @classmethod
-    async def cache_search(cls, user, query: str, limit: int = 5):
-        """缓存搜索结果"""
-        if results := tuple(await cls.search_repos(query, limit)):
-            async with db_sessionmaker() as session:
-                await session.execute(upsert(GithubSearch, user_id=user, results=results))
-                await session.commit()
-        return results
+    def prefetch(cls, results: tuple[Repository, ...]):
+        """在用户阅读列表时于后台请求前几项的完整信息，结果留在条件请求缓存中"""
+        for result in results[: cfg.prefetch]:
+            cls._prefetching.add(task := create_task(cls.get_repo(result.full_name)))
+            task.add_done_callback(cls._done)
 
     @classmethod
-    async def get_cached_repo(cls, user, index: int):
-        """获取缓存结果"""
-        async with db_sessionmaker() as session:
-            record = await session.scalar(select(GithubSearch).where(GithubSearch.user_id == user))
-
-            if not record or index >= len(record.results):
-                return None
+    def _done(cls, task: Task):
+        cls._prefetching.discard(task)
+        if not task.cancelled():
+            task.exception()
 
-            return await cls.get_repo(record.results[index])
+    @classmethod
+    def peek_repo(cls, full_name: str) -> Repository | None:
+        """不发起请求，仅返回缓存中已校验的完整仓库信息"""
+        if (entry := cls._cache.get(ConditionalCache.key(f"repos/{full_name}", None))) is not None:
+            return entry.parsed.get(Repository)
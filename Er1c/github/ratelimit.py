@@ -0,0 +1,84 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from asyncio import sleep
+from math import ceil
+from time import time
+
+
+class RateLimited(Exception):
+    """所有令牌的额度均已用尽"""
+
+    def __init__(self, resource: str, wait: float):
+        super().__init__(f"GitHub {resource} rate limit exhausted, resets in {wait:.0f}s")
+        self.resource = resource
+        self.wait = ceil(wait)
+
+
+class Budget:
+    __slots__ = ("remaining", "reset")
+
+    def __init__(self):
+        # 未知额度时先乐观地视为可用，首个响应头会校正
+        self.remaining = 1
+        self.reset = 0.0
+
+    def available(self, now: float):
+        return self.remaining > 0 or self.reset <= now
+
+
+class TokenPool:
+    """按资源（core/search）跟踪每个令牌的剩余额度，轮换使用额度最多的令牌"""
+
+    __slots__ = ("_budgets",)
+
+    def __init__(self):
+        self._budgets: dict[tuple[str, str], Budget] = {}
+
+    @staticmethod
+    def resource(endpoint: str):
+        return "search" if endpoint.startswith("search/") else "core"
+
+    def _pick(self, tokens: list[str], resource: str, now: float):
+        best = None
+        for token in tokens:
+            if (budget := self._budgets.setdefault((token, resource), Budget())).reset <= now and budget.remaining <= 0:
+                budget.remaining = 1
+            if budget.available(now) and (best is None or budget.remaining > best[1].remaining):
+                best = token, budget
+        return best
+
+    async def acquire(self, tokens: list[str], resource: str, max_wait: float):
+        """取出一个有额度的令牌并预扣一次；最早恢复时间不超过 `max_wait` 秒时排队等待，否则立即抛出 `RateLimited`"""
+        while (best := self._pick(tokens, resource, now := time())) is None:
+            wait = min(self._budgets[(token, resource)].reset for token in tokens) - now
+            if wait > max_wait:
+                raise RateLimited(resource, wait)
+            await sleep(wait)
+        token, budget = best
+        budget.remaining -= 1
+        return token
+
+    def update(self, token: str, resource: str, headers):
+        """根据响应头校正额度；返回该令牌此刻是否已被限流"""
+        budget = self._budgets.setdefault((token, resource), Budget())
+        if (remaining := headers.get("X-RateLimit-Remaining")) is not None:
+            budget.remaining = int(remaining)
+        if (reset := headers.get("X-RateLimit-Reset")) is not None:
+            budget.reset = float(reset)
+        if (retry_after := headers.get("Retry-After")) is not None:
+            # 次级限流
+            budget.remaining = 0
+            budget.reset = max(budget.reset, time() + float(retry_after))
+        return not budget.available(time())
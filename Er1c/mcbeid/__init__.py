@@ -13,26 +13,80 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import re
-from asyncio import create_task
+from asyncio import create_task, to_thread
+from pathlib import Path
 from traceback import format_exc
 
+from apscheduler.triggers.cron import CronTrigger
 from httpx import HTTPStatusError
 from ssrjson import loads
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from core.api import API
 from core.config import cfg
 from core.expr import PM, And
-from core.dispatcher import on_message
+from core.dispatcher import on_message, on_start
 from models.api import Message
+from services.apscheduler import sched
 from utils.aha import post_msg_to_supers
 from utils.network import get_httpx_client
 
+from .index import IDIndex, parse_entries
+
 try:
     from ..backfill_aha import reg_backfill
 except Exception:
     reg_backfill = lambda x: x
 
+try:
+    from ..poke_aha import poke_later
+except Exception:
+    poke_later = lambda event, factory=None: create_task((factory or API.poke)())
+
+try:
+    from ..single_flight_aha import single_flight
+except Exception:
+    single_flight = lambda service, key=None: lambda func: func
+
 SEARCH_LIMIT = cfg.register("search_limit", 3)
+MIRROR_URL = cfg.register("mirror_url", "")  # ID 表下载地址，留空则只读取本地文件
+MIRROR_FILE = cfg.register("mirror_file", "mcbeid.json")
+MIRROR_CRON = cfg.register("mirror_cron", "0 4 * * *")
+REMOTE_FALLBACK = cfg.register("remote_fallback", True)
+
+_index = IDIndex()
+
+
+def _build(raw: bytes):
+    (index := IDIndex()).rebuild(parse_entries(loads(raw)))
+    return index
+
+
+async def refresh_mirror():
+    """下载 ID 表并重建索引；数据无法解析时保留现有索引与本地文件"""
+    global _index
+    try:
+        (resp := await get_httpx_client().get(MIRROR_URL)).raise_for_status()
+        _index = await to_thread(_build, resp.content)
+        if MIRROR_FILE:
+            await to_thread(Path(MIRROR_FILE).write_bytes, resp.content)
+    except Exception:
+        create_task(post_msg_to_supers(f"更新 ID 表镜像时报错：\n{format_exc()}"))
+
+
+@on_start
+async def load_mirror():
+    global _index
+    if MIRROR_FILE and (path := Path(MIRROR_FILE)).is_file():
+        try:
+            _index = await to_thread(_build, await to_thread(path.read_bytes))
+        except Exception:
+            create_task(post_msg_to_supers(f"读取 ID 表镜像时报错：\n{format_exc()}"))
+    if MIRROR_URL:
+        if not _index:
+            create_task(refresh_mirror())
+        if MIRROR_CRON:
+            await sched.add_schedule(refresh_mirror, CronTrigger.from_crontab(MIRROR_CRON))
 
 
 @reg_backfill
@@ -41,6 +95,7 @@ async def wk(event: Message):
     await event.reply("BEID：\n[beid 词条]")
 
 
+@single_flight("mcbeid")
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=5), reraise=True)
 async def _fetch_api(query):
     try:
@@ -53,17 +108,31 @@ async def _fetch_api(query):
         raise
 
 
+def _format(items):
+    return [f'{item["enumName"]}：{item["key"]} -> {item["value"].split("\n")[0]}' for item in items]
+
+
 @reg_backfill
 @on_message(r"beid\s*(\S+)")
 async def mcbeid(event: Message, match_: re.Match):
-    await event.poke()
+    poke_later(event, event.poke)
+    query = match_[1].strip()
+    if _index:
+        result, total = _index.search(query, SEARCH_LIMIT)
+        if result or not REMOTE_FALLBACK:
+            if not result:
+                return await event.reply("没有找到结果。")
+            plain_texts = _format(result)
+            if total > SEARCH_LIMIT:
+                plain_texts.append(f"\n共 {total} 条结果，查看更多：https://ca.projectxero.top/idlist/")
+            return await event.reply("\n".join(plain_texts))
     try:
-        data = (await _fetch_api(match_[1].strip()))["data"]
+        data = (await _fetch_api(query))["data"]
     except Exception:
         create_task(post_msg_to_supers(f"请求 API 时报错：\n{format_exc()}"))
         return await event.reply("出错了。")
     if result := data["result"]:
-        plain_texts = [f'{item["enumName"]}：{item["key"]} -> {item["value"].split("\n")[0]}' for item in result[:SEARCH_LIMIT]]
+        plain_texts = _format(result[:SEARCH_LIMIT])
         if len(result) > SEARCH_LIMIT:
             plain_texts.append(f"\n查看更多：https://ca.projectxero.top/idlist/{data["hash"]}")
         return await event.reply("\n".join(plain_texts))
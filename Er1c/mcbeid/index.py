@@ -0,0 +1,65 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from array import array
+from collections import defaultdict
+from heapq import nsmallest
+
+
+def parse_entries(data):
+    """解析 ID 表，支持 ``[{"enumName", "key", "value"}, ...]`` 或 ``{enumName: {key: value}}`` 两种格式"""
+    if isinstance(data, dict):
+        return [(enum, str(k), str(v)) for enum, table in data.items() for k, v in table.items()]
+    return [(item["enumName"], str(item["key"]), str(item["value"])) for item in data]
+
+
+class IDIndex:
+    """ID 表的内存索引：对 key、value、enumName 建立一元与二元字串倒排表，查询时取最短的倒排表逐条校验"""
+
+    __slots__ = ("_entries", "_texts", "_keys", "_grams")
+
+    def __init__(self):
+        self._entries: list[tuple[str, str, str]] = []
+        self._texts: list[str] = []
+        self._keys: list[str] = []
+        self._grams: dict[str, array] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, entries: list[tuple[str, str, str]]):
+        grams = defaultdict(lambda: array("I"))
+        texts, keys = [], []
+        for i, (enum, key, value) in enumerate(entries):
+            keys.append(key := key.casefold())
+            texts.append(text := f"{key}\0{value.casefold()}\0{enum.casefold()}")
+            for g in {text[j : j + n] for n in (1, 2) for j in range(len(text) - n + 1)}:
+                if "\0" not in g:
+                    grams[g].append(i)
+        self._entries, self._texts, self._keys, self._grams = entries, texts, keys, dict(grams)
+
+    def search(self, query: str, limit: int):
+        """返回 (前 `limit` 条结果, 总匹配数)；key 完全匹配优先，其次为 key 前缀、key 包含，最后是 value 或 enumName 包含"""
+        if not (query := query.strip().casefold()):
+            return [], 0
+        postings = [self._grams.get(query[j : j + 2] if len(query) > 1 else query, ()) for j in range(max(len(query) - 1, 1))]
+        matched = [i for i in min(postings, key=len) if query in self._texts[i]]
+
+        def rank(i):
+            key = self._keys[i]
+            return 0 if key == query else 1 if key.startswith(query) else 2 if query in key else 3, i
+
+        return [
+            dict(zip(("enumName", "key", "value"), self._entries[i])) for i in nsmallest(limit, matched, key=rank)
+        ], len(matched)
@@ -36,6 +36,16 @@ try:
 except Exception:
     reg_backfill = lambda x: x
 
+try:
+    from ..member_cache_aha import get_card, is_member
+except Exception:
+
+    async def get_card(platform, group_id, user_id, full=False):
+        return await API.get_card_by_search(user_id, group_id, full)
+
+    async def is_member(platform, group_id, user_id):
+        return user_id in {i.user_id for i in await API.get_group_members(group_id)}
+
 HANDLING_FEE_RATIO = Decimal(cfg.register("handling_fee", "0.01", "转账手续费"))
 
 
@@ -88,7 +98,7 @@ async def query_points(event: Message):
 async def transfer_handler(event: Message, match_: Match):
     if await get_point() <= HANDLING_FEE_RATIO:
         return await event.reply("⚠️ 能量不足以转出")
-    if (receiver_id := match_[1]) not in {i.user_id for i in (await API.get_group_members(event.group_id))}:
+    if not await is_member(event.platform, event.group_id, receiver_id := match_[1]):
         return await event.reply("⚠️ 目标用户不是本群成员")
 
     points = Decimal(match_[2])
@@ -111,10 +121,10 @@ async def transfer_handler(event: Message, match_: Match):
 @on_message(rf"(?:能量|积分)?调整\s*{at_or_str()}\s+(\d+\.?\d*)", PM.super == True)
 async def adjust_points(event: Message, match_: Match):
     await adjust_point(event.platform, user_id := match_[1], Decimal(point := match_[2]))
-    await event.reply(f"已为 {await API.get_card_by_search(user_id, event.group_id)} 添加 {point} 点")
+    await event.reply(f"已为 {await get_card(event.platform, event.group_id, user_id)} 添加 {point} 点")
 
 
 @on_message(rf"(?:能量|积分)?设置\s*{at_or_str()}\s+(\d+\.?\d*)", PM.super == True)
 async def set_points(event: Message, match_: Match):
     await adjust_point(event.platform, user_id := match_[1], Decimal(match_[2]) - await get_point(event.platform, user_id))
-    await event.reply(f"已将 {await API.get_card_by_search(user_id, event.group_id)} 的积分设置为 {match_[2]} 点")
+    await event.reply(f"已将 {await get_card(event.platform, event.group_id, user_id)} 的积分设置为 {match_[2]} 点")
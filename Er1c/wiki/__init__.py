@@ -12,18 +12,23 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
-from asyncio import create_task
+from asyncio import create_task, to_thread
+from json import dumps, loads
 from re import Match
 from traceback import format_exc
 
+from apscheduler.triggers.interval import IntervalTrigger
+
 from core.api import API
 from core.config import cfg
 from core.expr import PM, And
-from core.dispatcher import on_message
+from core.dispatcher import on_message, on_start
 from models.api import Message
+from services.apscheduler import sched
 from utils.aha import post_msg_to_supers
 from utils.playwright import capture_element
 
+from .capture import CapturePool, ShotCache
 from .client import MediaWikiClient
 
 try:
@@ -31,9 +36,90 @@ try:
 except Exception:
     reg_backfill = lambda x: x
 
+try:
+    from ..poke_aha import poke_later
+except Exception:
+    poke_later = lambda event, factory=None: create_task((factory or API.poke)())
+
+try:
+    from ..selection_aha import offer, selection_owner
+except Exception:
+    # 没有 selection 模块时只列出相似结果，不接受序号选择
+    offer, selection_owner = None, lambda owner: lambda func: func
+
+try:
+    from ..single_flight_aha import single_flight
+except Exception:
+    single_flight = lambda service, key=None: lambda func: func
+
 WIKI_MAP = cfg.register(
     "wiki", {"wiki": "https://zh.minecraft.wiki", "enwiki": "https://minecraft.wiki", "devwiki": "https://wiki.mcbe-dev.net/w"}
 )
+CACHE_SIZE = cfg.register("cache_size", 2048)
+CACHE_TTL = cfg.register("cache_ttl", 3600)  # 超过该秒数的简介需比对修订号后才能使用
+LOCAL_INDEX = cfg.register("local_index", "")  # 由 dump.py 导入的本地索引，查询时优先使用
+CAPTURE_POOL = cfg.register("capture_pool", 2)  # 常驻的浏览器页面数，0 则使用通用的截图工具
+CAPTURE_QUEUE = cfg.register("capture_queue", 8)
+CAPTURE_TIMEOUT = cfg.register("capture_timeout", 20)
+CAPTURE_FORMAT = cfg.register("capture_format", "jpeg")
+CAPTURE_QUALITY = cfg.register("capture_quality", 80)
+CAPTURE_DIR = cfg.register("capture_dir", "wiki_captures")
+CAPTURE_CACHE_MB = cfg.register("capture_cache_mb", 256)
+
+_pool = CapturePool()
+_shots = ShotCache(CAPTURE_DIR)
+
+
+@on_start
+async def load_intros():
+    await MediaWikiClient.load_intros()
+    await sched.add_schedule(MediaWikiClient.revalidate_stale, IntervalTrigger(seconds=CACHE_TTL))
+
+
+@on_start
+async def start_capture_pool():
+    if CAPTURE_POOL > 0:
+        await to_thread(_shots.load)
+        create_task(_start_pool())
+
+
+async def _start_pool():
+    try:
+        await _pool.start(CAPTURE_POOL, WIKI_MAP.values())
+    except Exception:
+        create_task(post_msg_to_supers(f"启动截图页面池时报错，将使用通用截图工具：\n{format_exc()}"))
+
+
+@single_flight("wiki_capture")
+async def capture_infobox(url: str, revision: int = None):
+    """截取信息框；同一页面的同一修订只渲染一次
+
+    Args:
+        revision: 页面修订号，未给出时取简介缓存中的修订号。
+    """
+    if not _pool.started:
+        return await capture_element(url, "div.tabber-container-infobox", quality=100)
+    if revision is None:
+        revision = MediaWikiClient._intros.revision(url)
+    if revision is not None:
+        if data := await to_thread(_shots.get, name := ShotCache.name(url, revision, CAPTURE_FORMAT, CAPTURE_QUALITY)):
+            return data
+    data = await _pool.capture(
+        url, "div.tabber-container-infobox", CAPTURE_FORMAT, CAPTURE_QUALITY, CAPTURE_TIMEOUT, CAPTURE_QUEUE
+    )
+    if data and revision is not None:
+        await to_thread(_shots.put, name, data, CAPTURE_CACHE_MB * 2**20)
+    return data
+
+
+@on_message(r"词条缓存统计", PM.super == True)
+async def intro_stats(event: Message):
+    cache = MediaWikiClient._intros
+    ratio = cache.hits / total * 100 if (total := cache.hits + cache.misses) else 0
+    await event.reply(
+        f"词条简介缓存：{len(cache)} 条，命中 {cache.hits} 次，未命中 {cache.misses} 次，命中率 {ratio:.1f}%，"
+        f"已校验 {cache.revalidations} 次，其中 {cache.changed} 条已更新。"
+    )
 
 
 @reg_backfill
@@ -42,8 +128,8 @@ async def wk(event: Message):
     await event.reply("Wiki：\n[wiki/enwiki/devwiki 词条] - 中文MCwiki/英文MCwiki/基岩开发wiki")
 
 
-async def send_response(event: Message, result):
-    task = create_task(capture_element(result[1], "div.tabber-container-infobox", quality=100))
+async def send_response(event: Message, result, revision: int = None):
+    task = create_task(capture_infobox(result[1], revision))
     await event.reply("\n".join(result))
     if img := await task:
         await event.reply(image=img)
@@ -60,25 +146,27 @@ async def fetch(event: Message, match_: Match):
     if not (url := WIKI_MAP.get(match_[1])):
         return
 
-    await API.poke()
+    poke_later(event)
 
     try:
         if result := await (client := MediaWikiClient(url)).fetch_intro(term := match_[2].strip()):
             await send_response(event, result)
         else:
-            similar = await client.search_and_cache_results(uid := await event.user_aha_id(), term)
-            on_message(r"(\d+)", PM.uid == uid, exp=300)(reget)
+            if (similar := await client.search_intros(term)) and offer:
+                await offer(event, "wiki", [dumps(r, ensure_ascii=False) for r in similar], once=True)
             await event.reply(
-                f"找不到该词条{f"，相似的有：\n{"\n".join(f"{i+1}. {v}" for i, v in enumerate(similar))}\n五分钟内发送序号即可获取" if similar else "。"}"
+                f"找不到该词条{f"，相似的有：\n{"\n".join(f"{i+1}. {v[0]}" for i, v in enumerate(similar))}{"\n五分钟内发送序号即可获取" if offer else ""}" if similar else "。"}"
             )
     except Exception:
         await handle_error(event)
 
 
-async def reget(event: Message, match_: Match):
-    create_task(API.poke())
+@selection_owner("wiki")
+async def reget(event: Message, choice: str):
+    """`choice` 为 JSON 格式的 (标题, 简介文本, 页面URL, 修订号)，旧记录没有修订号"""
+    poke_later(event)
     try:
-        if result := await MediaWikiClient().get_cached_intro(await event.user_aha_id(), int(match_[1]) - 1):
-            await send_response(event, result)
+        _title, extract, fullurl, *revision = loads(choice)
+        await send_response(event, (extract, fullurl), next(iter(revision), None))
     except Exception:
         await handle_error(event)
@@ -0,0 +1,74 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from collections import OrderedDict
+
+
+def normalize_title(title: str):
+    """按 MediaWiki 的规则规范化标题：下划线视为空格、合并空白、首字母大写"""
+    title = " ".join(title.replace("_", " ").split())
+    return title[:1].upper() + title[1:]
+
+
+class IntroEntry:
+    __slots__ = ("target", "extract", "fullurl", "lastrevid", "checked")
+
+    def __init__(self, target: str, extract: str, fullurl: str, lastrevid: int, checked: float):
+        self.target = target
+        self.extract = extract
+        self.fullurl = fullurl
+        self.lastrevid = lastrevid
+        self.checked = checked
+
+
+class IntroCache:
+    """以 (base_url, 规范化标题) 为键的简介 LRU 缓存，并统计命中率"""
+
+    __slots__ = ("_entries", "_revisions", "hits", "misses", "revalidations", "changed")
+
+    def __init__(self):
+        self._entries: OrderedDict[tuple[str, str], IntroEntry] = OrderedDict()
+        self._revisions: dict[str, int] = {}
+        self.hits = self.misses = self.revalidations = self.changed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: tuple[str, str]):
+        if (entry := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def revision(self, fullurl: str):
+        """页面当前缓存的修订号"""
+        return self._revisions.get(fullurl)
+
+    def put(self, key: tuple[str, str], entry: IntroEntry, size: int):
+        """写入条目，返回被淘汰的键"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._revisions[entry.fullurl] = entry.lastrevid
+        evicted = []
+        while len(self._entries) > size:
+            evicted.append(k := next(iter(self._entries)))
+            self.pop(k)
+        return evicted
+
+    def pop(self, key: tuple[str, str]):
+        if (entry := self._entries.pop(key, None)) is not None and self._revisions.get(entry.fullurl) == entry.lastrevid:
+            del self._revisions[entry.fullurl]
+        return entry
+
+    def stale(self, before: float):
+        return [(k, e) for k, e in self._entries.items() if e.checked < before]
@@ -0,0 +1,143 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from asyncio import Queue, wait_for
+from collections import OrderedDict
+from contextlib import suppress
+from hashlib import blake2b
+from pathlib import Path
+from threading import Lock
+
+from playwright.async_api import Browser, Page, async_playwright
+
+
+class ShotCache:
+    """磁盘上的截图缓存，以 (页面URL, 修订号, 格式, 质量) 为键，总大小超过上限时淘汰最久未用的文件
+
+    get/put 经 to_thread 并发调用，索引只在持锁时修改，文件读写在锁外进行
+    """
+
+    __slots__ = ("_dir", "_files", "_bytes", "_lock")
+
+    def __init__(self, directory: str):
+        self._dir = Path(directory)
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def load(self):
+        self._dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for path in sorted(self._dir.iterdir(), key=lambda p: p.stat().st_mtime):
+                self._files[path.name] = size = path.stat().st_size
+                self._bytes += size
+
+    @staticmethod
+    def name(url: str, revision: int, fmt: str, quality: int):
+        return f"{blake2b(f"{url}\0{revision}\0{quality}".encode(), digest_size=16).hexdigest()}.{fmt}"
+
+    def get(self, name: str):
+        with self._lock:
+            if name not in self._files:
+                return None
+        try:
+            data = (self._dir / name).read_bytes()
+        except OSError:
+            # 文件可能刚被另一线程淘汰，索引项也可能已经不在
+            with self._lock:
+                self._bytes -= self._files.pop(name, 0)
+            return None
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+        return data
+
+    def put(self, name: str, data: bytes, max_bytes: int):
+        (self._dir / name).write_bytes(data)
+        evicted = []
+        with self._lock:
+            self._bytes += len(data) - self._files.get(name, 0)
+            self._files[name] = len(data)
+            self._files.move_to_end(name)
+            while self._bytes > max_bytes and len(self._files) > 1:
+                old, size = self._files.popitem(last=False)
+                self._bytes -= size
+                evicted.append(old)
+        for old in evicted:
+            with suppress(OSError):
+                (self._dir / old).unlink()
+
+
+class CapturePool:
+    """固定数量、预热过的浏览器页面池；排队超过上限或等待超时时放弃截图"""
+
+    __slots__ = ("_playwright", "_browser", "_pages", "_waiting")
+
+    def __init__(self):
+        self._playwright = None
+        self._browser: Browser | None = None
+        self._pages: Queue[Page] = Queue()
+        self._waiting = 0
+
+    @property
+    def started(self):
+        return self._browser is not None
+
+    async def start(self, size: int, warm_urls=()):
+        """启动浏览器并预热全部页面，全部就绪后才启用；中途出错时关闭已启动的部分并抛出"""
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.launch()
+            pages = []
+            for _i in range(size):
+                pages.append(page := await self._new_page(browser))
+                # 预先载入站点，样式与字体会留在该上下文的缓存里
+                for url in warm_urls:
+                    with suppress(Exception):
+                        await page.goto(url, wait_until="domcontentloaded")
+        except BaseException:
+            with suppress(Exception):
+                await playwright.stop()
+            raise
+        self._playwright, self._browser = playwright, browser
+        for page in pages:
+            self._pages.put_nowait(page)
+
+    async def _new_page(self, browser: Browser = None):
+        return await (await (browser or self._browser).new_context(viewport={"width": 1280, "height": 720})).new_page()
+
+    async def capture(self, url: str, selector: str, fmt: str, quality: int, timeout: float, max_queue: int):
+        """截取 `url` 中首个匹配 `selector` 的元素，失败、排队已满或超时时返回 None"""
+        if self._waiting >= max_queue:
+            return None
+        self._waiting += 1
+        try:
+            page = await wait_for(self._pages.get(), timeout)
+        except TimeoutError:
+            return None
+        finally:
+            self._waiting -= 1
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+            if (element := await page.query_selector(selector)) is None:
+                return None
+            return await element.screenshot(type=fmt, quality=quality if fmt == "jpeg" else None, timeout=timeout * 1000)
+        except Exception:
+            # 出错的页面可能处于异常状态，换一个新的上下文
+            with suppress(Exception):
+                await page.context.close()
+                page = await self._new_page()
+            return None
+        finally:
+            self._pages.put_nowait(page)
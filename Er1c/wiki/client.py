@@ -12,22 +12,35 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from asyncio import to_thread
+from collections import defaultdict
 from contextlib import suppress
+from time import time
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from ssrjson import loads
 from tenacity import retry, stop_after_attempt, wait_exponential
 from urllib.parse import urljoin
 
+from core.config import cfg
 from core.database import db_sessionmaker
 from utils.network import get_httpx_client
 from utils.sqlalchemy import upsert
 
-from .database import WikiSearch
+from .cache import IntroCache, IntroEntry, normalize_title
+from .database import WikiIntro
+from .local import LocalIndex
+
+try:
+    from ..single_flight_aha import single_flight
+except Exception:
+    single_flight = lambda service, key=None: lambda func: func
 
 
 class MediaWikiClient:
     __slots__ = ("_base_url",)
+    _intros = IntroCache()
+    _local = LocalIndex()
 
     def __init__(
         self,
@@ -39,6 +52,7 @@ class MediaWikiClient:
         """
         self._base_url = base_url
 
+    @single_flight("wiki", lambda self, params: (self._base_url, params))
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=5), reraise=True)
     async def _fetch_api(self, params: dict) -> dict:
         (resp := await get_httpx_client().get(urljoin(self._base_url, "api.php"), params=params)).raise_for_status()
@@ -51,6 +65,22 @@ class MediaWikiClient:
         """
         :return: (简介文本, 页面URL)
         """
+        if (entry := self._intros.get(key := (self._base_url, normalize_title(term)))) is not None:
+            if entry.checked < time() - cfg.cache_ttl:
+                # 站点不可用时沿用旧简介
+                with suppress(Exception):
+                    await self.revalidate([(key, entry)])
+            # 修订号未变时条目仍在缓存中
+            if self._intros.get(key) is entry:
+                self._intros.hits += 1
+                return entry.extract, entry.fullurl
+        self._intros.misses += 1
+        if local := await to_thread(self._local.intro, cfg.local_index, self._base_url, term):
+            # 与在线结果走同一缓存，截图缓存也能取得修订号
+            entry = IntroEntry(*local, time())
+            await self._store([(key, entry)])
+            return entry.extract, entry.fullurl
+
         try:
             data = await self._fetch_api(
                 {
@@ -74,45 +104,101 @@ class MediaWikiClient:
         if (page := next(iter(pages.values()))).get("pageid", -1) == -1:
             return None
 
-        return page.get("extract", ""), page.get("fullurl", "")
+        entry = IntroEntry(page["title"], page.get("extract", ""), page.get("fullurl", ""), page.get("lastrevid", 0), time())
+        await self._store([(key, entry)])
+        return entry.extract, entry.fullurl
+
+    @classmethod
+    async def _store(cls, items: list[tuple[tuple[str, str], IntroEntry]]):
+        evicted = []
+        async with db_sessionmaker() as session:
+            for (base_url, title), entry in items:
+                evicted += cls._intros.put((base_url, title), entry, cfg.cache_size)
+                await session.execute(
+                    upsert(WikiIntro, base_url=base_url, title=title, **{k: getattr(entry, k) for k in IntroEntry.__slots__})
+                )
+            for base_url, title in evicted:
+                await session.execute(delete(WikiIntro).where(WikiIntro.base_url == base_url, WikiIntro.title == title))
+            await session.commit()
+
+    @classmethod
+    async def revalidate(cls, items: list[tuple[tuple[str, str], IntroEntry]]):
+        """以每批 50 个标题的 prop=info 请求比对修订号：未变的条目续期，已变的移出缓存"""
+        by_site = defaultdict(list)
+        for key, entry in items:
+            by_site[key[0]].append((key, entry))
+        fresh, changed = [], []
+        for base_url, site_items in by_site.items():
+            client = cls(base_url)
+            for i in range(0, len(site_items), 50):
+                batch = site_items[i : i + 50]
+                data = await client._fetch_api(
+                    {"action": "query", "format": "json", "prop": "info", "titles": "|".join({e.target for _, e in batch})}
+                )
+                revs = {p["title"]: p.get("lastrevid") for p in data.get("query", {}).get("pages", {}).values()}
+                for key, entry in batch:
+                    (fresh if revs.get(entry.target) == entry.lastrevid else changed).append((key, entry))
+        cls._intros.revalidations += len(items)
+        cls._intros.changed += len(changed)
+        now = time()
+        for _, entry in fresh:
+            entry.checked = now
+        await cls._store(fresh)
+        if changed:
+            async with db_sessionmaker() as session:
+                for base_url, title in (key for key, _ in changed):
+                    cls._intros.pop((base_url, title))
+                    await session.execute(delete(WikiIntro).where(WikiIntro.base_url == base_url, WikiIntro.title == title))
+                await session.commit()
+
+    @classmethod
+    async def revalidate_stale(cls):
+        """批量续期所有过期条目，使常用词条的查询始终命中缓存"""
+        if items := cls._intros.stale(time() - cfg.cache_ttl):
+            await cls.revalidate(items)
+
+    @classmethod
+    async def load_intros(cls):
+        """从数据库载入最近校验过的简介"""
+        async with db_sessionmaker() as session:
+            rows = (
+                await session.scalars(select(WikiIntro).order_by(WikiIntro.checked.desc()).limit(cfg.cache_size))
+            ).all()
+        for row in reversed(rows):
+            cls._intros.put(
+                (row.base_url, row.title),
+                IntroEntry(row.target, row.extract, row.fullurl, row.lastrevid, row.checked),
+                cfg.cache_size,
+            )
 
-    async def search_similar(self, term: str, limit: int = 3):
-        """搜索相似词条
+    async def search_intros(self, term: str, limit: int = 3) -> list[tuple[str, str, str, int]]:
+        """在一次请求中搜索相似词条并取得其简介
 
         Args:
             limit: 最多返回几个结果。
+
+        Returns:
+            按搜索相关度排序的 (标题, 简介文本, 页面URL, 修订号)。
         """
+        if local := await to_thread(self._local.search, cfg.local_index, self._base_url, term, limit):
+            return local
         data = await self._fetch_api(
             {
                 "action": "query",
                 "format": "json",
-                "list": "search",
-                "srsearch": term,
-                "srlimit": str(limit),
-                "srwhat": "text",
+                "generator": "search",
+                "gsrsearch": term,
+                "gsrlimit": str(limit),
+                "gsrwhat": "text",
+                "prop": "extracts|info",
+                "inprop": "url",
+                "exintro": "1",
+                "explaintext": "1",
+                "exlimit": "max",
             }
         )
 
-        search_results = data.get("query", {}).get("search", [])
-        return [result["title"] for result in search_results]
-
-    async def get_cached_intro(self, user, index: int):
-        async with db_sessionmaker() as session:
-            record = await session.scalar(select(WikiSearch).where(WikiSearch.user_id == user))
-
-            if not record or index >= len(record.results):
-                return None
-
-            self._base_url = record.base_url
-
-            await session.delete(record)
-            await session.commit()
-
-            return await self.fetch_intro(record.results[index])
-
-    async def search_and_cache_results(self, user, term: str, limit: int = 3):
-        if results := await self.search_similar(term, limit):
-            async with db_sessionmaker() as session:
-                await session.execute(upsert(WikiSearch, user_id=user, base_url=self._base_url, results=results))
-                await session.commit()
-        return results
+        pages = sorted(data.get("query", {}).get("pages", {}).values(), key=lambda p: p.get("index", 0))
+        return [
+            (page["title"], page.get("extract", ""), page.get("fullurl", ""), page.get("lastrevid", 0)) for page in pages
+        ]
@@ -12,14 +12,17 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
-from sqlalchemy import BigInteger, Column, Text
+from sqlalchemy import BigInteger, Column, Float, Text
 
-from models.sqlalchemy import Iterable
 from core.database import dbBase
 
 
-class WikiSearch(dbBase):
-    __tablename__ = "wiki_search"
-    user_id = Column(BigInteger, primary_key=True)
-    base_url = Column(Text)
-    results = Column(Iterable)
+class WikiIntro(dbBase):
+    __tablename__ = "wiki_intro"
+    base_url = Column(Text, primary_key=True)
+    title = Column(Text, primary_key=True)  # 规范化后的查询词条
+    target = Column(Text)  # 重定向后的页面标题
+    extract = Column(Text)
+    fullurl = Column(Text)
+    lastrevid = Column(BigInteger)
+    checked = Column(Float)
@@ -0,0 +1,168 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""将 MediaWiki XML 转储增量导入本地全文索引。
+
+在 Aha 部署中运行，例如 ``python -m <模块包>.dump https://zh.minecraft.wiki zhmcwiki-pages-current.xml.bz2``，
+站点地址需与配置 ``wiki`` 中的值一致；随后将配置 ``local_index`` 指向生成的数据库。
+重复导入时修订号未变的页面会被跳过。
+"""
+
+import re
+import sqlite3
+from argparse import ArgumentParser
+from bz2 import open as bz2_open
+from gzip import open as gzip_open
+from pathlib import Path
+from time import perf_counter, time
+from urllib.parse import quote
+from xml.etree.ElementTree import iterparse
+
+from .local import SCHEMA
+
+_HEADING = re.compile(r"^=+[^=\n].*?=+[ \t]*$", re.M)
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>", re.S | re.I)
+_DROP_TAGS = re.compile(r"<(gallery|math|pre|syntaxhighlight|score|timeline)[^>]*>.*?</\1>", re.S | re.I)
+_TAG = re.compile(r"</?[a-z][^>]*>", re.I)
+_LINK = re.compile(r"\[\[([^\[\]]*)\]\]")
+_EXTERNAL = re.compile(r"\[(?:https?:)?//[^\s\]]+(?:\s+([^\]]*))?\]")
+_MAGIC = re.compile(r"__[A-Z]+__")
+_QUOTES = re.compile(r"'{2,}")
+_BLANK = re.compile(r"\n\s*\n+")
+_SKIP_NS = re.compile(r"^\s*:?\s*(file|image|media|category|文件|图像|媒体|分类|[a-z]{2,3}(?:-[a-z]+)?)\s*:", re.I)
+
+
+def _strip_nested(text: str, start: str, end: str):
+    out, depth, i = [], 0, 0
+    while i < len(text):
+        if text.startswith(start, i):
+            depth += 1
+            i += len(start)
+        elif depth and text.startswith(end, i):
+            depth -= 1
+            i += len(end)
+        else:
+            if not depth:
+                out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def _link(match: re.Match):
+    if _SKIP_NS.match(inner := match[1]):
+        return ""
+    return inner.rsplit("|", 1)[-1]
+
+
+def lead_plaintext(wikitext: str):
+    """取首个标题之前的导言并粗略转为纯文本"""
+    text = _HEADING.split(wikitext, 1)[0]
+    text = _DROP_TAGS.sub("", _REF.sub("", _COMMENT.sub("", text)))
+    text = _strip_nested(_strip_nested(text, "{{", "}}"), "{|", "|}")
+    while (linked := _LINK.sub(_link, text)) != text:
+        text = linked
+    text = _EXTERNAL.sub(lambda m: m[1] or "", text)
+    text = _QUOTES.sub("", _MAGIC.sub("", _TAG.sub("", text)))
+    return _BLANK.sub("\n", text).strip()
+
+
+def _open_dump(path: Path):
+    match path.suffix:
+        case ".bz2":
+            return bz2_open(path)
+        case ".gz":
+            return gzip_open(path)
+    return path.open("rb")
+
+
+def import_dump(db: sqlite3.Connection, site: str, path: Path, prune=False):
+    """流式解析转储，每处理完一个页面即释放其节点；返回各类页面的计数"""
+    stats = dict.fromkeys(("added", "updated", "unchanged", "redirects", "pruned"), 0)
+    seen = int(time())
+    pages = 0
+    article = site.rstrip("/") + "/"
+    with _open_dump(path) as f:
+        context = iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        ns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""
+        for event, elem in context:
+            if event != "end":
+                continue
+            if elem.tag == f"{ns}base" and elem.text:
+                # siteinfo 中的 base 是首页地址，其目录即条目路径
+                article = elem.text.rsplit("/", 1)[0] + "/"
+            elif elem.tag == f"{ns}page":
+                if elem.findtext(f"{ns}ns") == "0":
+                    title = elem.findtext(f"{ns}title")
+                    if (redirect := elem.find(f"{ns}redirect")) is not None:
+                        db.execute(
+                            "INSERT INTO redirects VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (site, title) DO UPDATE SET target = excluded.target, seen = excluded.seen",
+                            (site, title, redirect.get("title"), seen),
+                        )
+                        stats["redirects"] += 1
+                    else:
+                        revid = int(elem.findtext(f"{ns}revision/{ns}id"))
+                        row = db.execute("SELECT revid FROM pages WHERE site = ? AND title = ?", (site, title)).fetchone()
+                        if row and row[0] == revid:
+                            db.execute("UPDATE pages SET seen = ? WHERE site = ? AND title = ?", (seen, site, title))
+                            stats["unchanged"] += 1
+                        else:
+                            db.execute(
+                                "INSERT INTO pages (site, title, revid, extract, url, seen) VALUES (?, ?, ?, ?, ?, ?) "
+                                "ON CONFLICT (site, title) DO UPDATE SET "
+                                "revid = excluded.revid, extract = excluded.extract, url = excluded.url, seen = excluded.seen",
+                                (
+                                    site,
+                                    title,
+                                    revid,
+                                    lead_plaintext(elem.findtext(f"{ns}revision/{ns}text") or ""),
+                                    article + quote(title.replace(" ", "_")),
+                                    seen,
+                                ),
+                            )
+                            stats["updated" if row else "added"] += 1
+                root.clear()
+                if not (pages := pages + 1) % 1000:
+                    db.commit()
+    if prune:
+        for table in ("pages", "redirects"):
+            stats["pruned"] += db.execute(f"DELETE FROM {table} WHERE site = ? AND seen < ?", (site, seen)).rowcount
+    db.commit()
+    return stats
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("site", help="站点地址，与配置 wiki 中的值一致")
+    parser.add_argument("dump", type=Path, help="pages-articles/pages-current 转储，可为 .bz2 或 .gz")
+    parser.add_argument("--db", default="wiki_local.db", help="索引数据库路径")
+    parser.add_argument("--prune", action="store_true", help="删除本次转储中已不存在的页面")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    # 导入在独立进程中运行；WAL 模式下 bot 的只读查询不会被长事务阻塞
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    start = perf_counter()
+    stats = import_dump(db, args.site, args.dump, args.prune)
+    db.execute("INSERT INTO pages_fts(pages_fts) VALUES ('optimize')")
+    db.commit()
+    db.close()
+    print(", ".join(f"{k} {v}" for k, v in stats.items()), f"({perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Copyright (C) 2025 github.com/Eric-Joker
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+import sqlite3
+from pathlib import Path
+
+from .cache import normalize_title
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    site TEXT NOT NULL,
+    title TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    extract TEXT NOT NULL,
+    url TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    UNIQUE (site, title)
+);
+CREATE TABLE IF NOT EXISTS redirects (
+    site TEXT NOT NULL,
+    title TEXT NOT NULL,
+    target TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (site, title)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    title, extract, content='pages', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS pages_ai AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts(rowid, title, extract) VALUES (new.id, new.title, new.extract);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_ad AFTER DELETE ON pages BEGIN
+    INSERT INTO pages_fts(pages_fts, rowid, title, extract) VALUES ('delete', old.id, old.title, old.extract);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_au AFTER UPDATE OF title, extract ON pages BEGIN
+    INSERT INTO pages_fts(pages_fts, rowid, title, extract) VALUES ('delete', old.id, old.title, old.extract);
+    INSERT INTO pages_fts(rowid, title, extract) VALUES (new.id, new.title, new.extract);
+END;
+"""
+
+
+class LocalIndex:
+    """由 Wiki 转储导入的本地索引（见 dump.py），只读打开；查询是同步的，应在线程中调用"""
+
+    __slots__ = ("_path", "_conn")
+
+    def __init__(self):
+        self._path = None
+        self._conn: sqlite3.Connection | None = None
+
+    def _open(self, path: str):
+        if path != self._path:
+            if self._conn is not None:
+                self._conn.close()
+            self._path = path
+            self._conn = (
+                sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+                if path and Path(path).is_file()
+                else None
+            )
+        return self._conn
+
+    def intro(self, path: str, site: str, term: str) -> tuple[str, str, str, int] | None:
+        """按标题（跟随重定向）取得 (标题, 简介文本, 页面URL, 修订号)"""
+        if (conn := self._open(path)) is None:
+            return None
+        title = normalize_title(term)
+        if row := conn.execute("SELECT target FROM redirects WHERE site = ? AND title = ?", (site, title)).fetchone():
+            title = row[0]
+        return conn.execute(
+            "SELECT title, extract, url, revid FROM pages WHERE site = ? AND title = ?", (site, title)
+        ).fetchone()
+
+    def search(self, path: str, site: str, term: str, limit: int) -> list[tuple[str, str, str, int]]:
+        """全文搜索，返回按相关度排序的 (标题, 简介文本, 页面URL, 修订号)；标题命中的权重更高"""
+        if (conn := self._open(path)) is None or not (term := term.strip()):
+            return []
+        if len(term) < 3:
+            # trigram 分词无法匹配过短的词，退回标题子串匹配
+            return conn.execute(
+                "SELECT title, extract, url, revid FROM pages WHERE site = ? AND instr(title, ?) ORDER BY length(title) LIMIT ?",
+                (site, term, limit),
+            ).fetchall()
+        return conn.execute(
+            "SELECT p.title, p.extract, p.url, p.revid FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid "
+            "WHERE pages_fts MATCH ? AND p.site = ? ORDER BY bm25(pages_fts, 10.0, 1.0) LIMIT ?",
+            ('"' + term.replace('"', '""') + '"', site, limit),
+        ).fetchall()
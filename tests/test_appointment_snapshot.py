@@ -0,0 +1,77 @@
+"""Round trip of appointment event snapshots; run with ``python -m unittest discover tests`` from an Aha deployment."""
+
+import unittest
+from datetime import datetime
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, Field
+
+try:
+    import models.api  # noqa: F401
+except ImportError:
+    raise unittest.SkipTest("models.api is only available inside an Aha deployment")
+
+# 直接按路径加载，避免导入依赖整个框架的模块包
+_spec = spec_from_file_location("appointment_snapshot", Path(__file__).parents[1] / "Aha" / "appointment" / "snapshot.py")
+snapshot = module_from_spec(_spec)
+_spec.loader.exec_module(snapshot)
+
+
+class Text(BaseModel):
+    type: Literal["text"] = "text"
+    text: str = ""
+
+
+class At(BaseModel):
+    type: Literal["at"] = "at"
+    user_id: str = ""
+    text: str = ""
+
+
+class Sender(BaseModel):
+    nickname: str = ""
+    role: Literal["owner", "admin", "member"] | None = None
+
+
+class Event(BaseModel):
+    platform: str
+    user_id: str
+    group_id: str | None = None
+    time: datetime
+    sender: Sender = Sender()
+    message: list[Annotated[Text | At, Field(discriminator="type")]] = []
+    raw: dict = {}
+
+
+class SnapshotTest(unittest.TestCase):
+    def assert_round_trip(self, event: BaseModel):
+        self.assertEqual(snapshot.load_event(snapshot.dump_event(event), type(event)), event)
+
+    def test_default_tags_survive(self):
+        # 两种段只有 type 区分，且都取默认值；省略 type 时重新加载会选错段类型
+        self.assert_round_trip(
+            Event(platform="qq", user_id="1", time=datetime(2025, 1, 1), message=[At(text="x"), Text(text="x"), Text()])
+        )
+
+    def test_nested_and_raw(self):
+        self.assert_round_trip(
+            Event(
+                platform="qq",
+                user_id="1",
+                group_id="2",
+                time=datetime(2025, 1, 1, 8),
+                sender=Sender(nickname="n", role="admin"),
+                message=[At(user_id="3")],
+                raw={"a": [1, {"b": None}], "c": ""},
+            )
+        )
+
+    def test_unknown_version(self):
+        with self.assertRaises(ValueError):
+            snapshot.load_event(b"\x00", Event)
+
+
+if __name__ == "__main__":
+    unittest.main()